@@ -991,6 +991,7 @@ def main(args):
                          background_color='white')
         else:
             sys.stderr.write('warning: cairosvg not available; skip PNG conversion\n')
+    return svg_content
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
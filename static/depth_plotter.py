@@ -3,6 +3,8 @@ import numpy as np
 # Optional plotting imports (allow using non-plotting utilities without matplotlib)
 _HAS_MPL = True
 try:
+    import matplotlib
+    matplotlib.use('Agg')  # file output only; avoids GUI backend setup per figure
     import matplotlib.pyplot as plt
     import matplotlib.backends.backend_pdf as pdf_backend
     from matplotlib.ticker import FuncFormatter
@@ -11,7 +13,17 @@ except Exception:
 import argparse
 import os
 import gzip
-from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
+import mmap
+import re
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from collections import defaultdict
 import bisect
 from typing import Dict, List, Tuple, Optional
@@ -20,8 +32,232 @@ try:
     import pandas as pd
 except Exception:
     pd = None
+# Optional ISA-L accelerated gzip (python-isal)
+try:
+    from isal import igzip
+except Exception:
+    igzip = None
+try:
+    # Inflates on a background thread, overlapping decompression with parsing
+    from isal import igzip_threaded
+except Exception:
+    igzip_threaded = None
 from array import array
 
+# Read size for the chunked depth-file scanner
+_CHUNK_SIZE = 8 << 20
+# --region value: chr:start-end
+_REGION_RE = re.compile(r'^([^:]+):(\d+)-(\d+)$')
+# Above this many non-zero segments, windowed sums use one reduceat call instead of a
+# per-segment loop
+_BLOCK_SUM_MAX_SEGMENTS = 256
+# Block size handed to the threaded ISA-L reader
+_GZIP_BLOCK_SIZE = 1 << 20
+# Smallest accepted --gzip-buffer; tinier buffers make decompression crawl
+_MIN_GZIP_BUFFER = 4096
+
+
+def _readonly_empty(dtype) -> np.ndarray:
+    arr = np.empty(0, dtype=dtype)
+    arr.flags.writeable = False
+    return arr
+
+
+# Shared read-only results for empty-input fast paths (avoids a fresh float64 array per call)
+_EMPTY_F64 = _readonly_empty(np.float64)
+_EMPTY_I64 = _readonly_empty(np.int64)
+_EMPTY_U16 = _readonly_empty(np.uint16)
+# Bytes the vectorized depth-block tokenizer accepts
+_DEPTH_BLOCK_CHARS = b'0123456789 \t\r\n'
+
+
+@contextmanager
+def _open_depth_file(path: str, buffer_size: int = _GZIP_BLOCK_SIZE):
+    """Open a depth file for binary reading.
+
+    .gz files are decompressed with ISA-L (python-isal) when installed, on a background
+    thread if the installed igzip_threaded accepts block_size; otherwise by a pigz subprocess running
+    on its own core, and finally by the stdlib gzip module. buffer_size sets the
+    decompressed block/pipe buffer size for all of them.
+    """
+    if not path.endswith('.gz'):
+        with open(path, 'rb') as f:
+            yield f
+        return
+    if igzip_threaded is not None:
+        try:
+            threaded = igzip_threaded.open(path, 'rb', threads=1, block_size=buffer_size)
+        except TypeError:
+            # Older python-isal releases ship igzip_threaded without block_size
+            threaded = None
+        if threaded is not None:
+            with threaded as f:
+                yield f
+            return
+    if igzip is not None:
+        with igzip.open(path, 'rb') as f:
+            yield io.BufferedReader(f, buffer_size=buffer_size)
+        return
+    pigz = shutil.which('pigz')
+    if pigz is None:
+        with gzip.open(path, 'rb') as f:
+            yield io.BufferedReader(f, buffer_size=buffer_size)
+        return
+    proc = subprocess.Popen([pigz, '-dc', path], stdout=subprocess.PIPE, bufsize=buffer_size)
+    try:
+        yield proc.stdout
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise OSError(f"pigz failed to decompress {path} (exit code {returncode})")
+
+
+def _depth_windows(f, mappable: bool):
+    """Yield (buffer, cut) windows over a depth file; buffer[:cut] holds only whole lines.
+
+    Plain files are memory-mapped and yielded as a single window, so bodies of non-target
+    sequences are skipped without being read into Python bytes. Streams (decompressed .gz)
+    are read in _CHUNK_SIZE pieces with the partial last line carried over.
+    """
+    if mappable:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm, size
+        return
+    tail = b''
+    while True:
+        chunk = f.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf = tail + chunk
+        # Only handle complete lines; carry the partial last line over
+        cut = buf.rfind(b'\n') + 1
+        tail = buf[cut:]
+        yield buf, cut
+    if tail:
+        yield tail + b'\n', len(tail) + 1
+
+
+def _parse_depth_block(block: bytes) -> np.ndarray:
+    """Parse a newline-separated run of depth values into an array that fits in uint16.
+
+    Values are clamped to 0-65535 in one vectorized pass; negative values become 0 so
+    positions stay aligned. Blocks that are not one plain integer per line (signs, blank
+    lines, stray text) fall back to line-by-line parsing.
+    """
+    if not block or block.isspace():
+        return _EMPTY_I64
+    values = None
+    if not block.translate(None, _DEPTH_BLOCK_CHARS):
+        # Digits and whitespace only, so NumPy tokenizes the whole block; a count that
+        # differs from the line count means blank or multi-value lines
+        n_lines = block.count(b'\n') + (not block.endswith(b'\n'))
+        values = np.fromstring(block, dtype=np.int64, sep='\n')
+        if len(values) != n_lines:
+            values = None
+    if values is None:
+        values = []
+        for line in block.split(b'\n'):
+            try:
+                values.append(int(line))
+            except ValueError:
+                continue
+        values = np.array(values, dtype=np.int64)
+    # int64 tokenization avoids silent wrap-around of huge values before clamping
+    np.clip(values, 0, 65535, out=values)
+    return values
+
+
+class _DepthBuffer:
+    """Collect the parsed depth blocks of one sequence into a np.uint16 array.
+
+    When the sequence length is known (from the FAI) a single buffer is preallocated
+    (or handed in as a slice of a larger one) and filled by index; otherwise, or if the
+    file holds more values than expected, blocks are kept aside and concatenated at the
+    end. The depth sum is accumulated while each block is still in cache, so the mean
+    needs no second pass.
+    """
+
+    def __init__(self, expected_length: int = None, buffer: np.ndarray = None):
+        if buffer is None and expected_length:
+            buffer = np.empty(expected_length, dtype=np.uint16)
+        self.buffer = buffer
+        self.filled = 0
+        self.pieces = []
+        self.count = 0
+        self.total = 0
+
+    def append(self, values: np.ndarray):
+        n = len(values)
+        self.count += n
+        self.total += int(values.sum())
+        if self.buffer is not None and not self.pieces and self.filled + n <= len(self.buffer):
+            self.buffer[self.filled:self.filled + n] = values
+            self.filled += n
+        else:
+            self.pieces.append(values.astype(np.uint16))
+
+    def result(self) -> np.ndarray:
+        head = self.buffer[:self.filled] if self.buffer is not None else _EMPTY_U16
+        if not self.pieces:
+            return head
+        return np.concatenate([head] + self.pieces)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+def _mask_run_bounds(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return arrays of inclusive start and end indices for each run of True values in a boolean mask"""
+    padded = np.zeros(len(mask) + 2, dtype=np.int8)
+    padded[1:-1] = mask
+    # Rising edges mark run starts, falling edges mark one past run ends
+    edges = np.flatnonzero(np.diff(padded))
+    return edges[0::2], edges[1::2] - 1
+
+
+def _mask_runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """Return inclusive (start, end) index pairs for each run of True values in a boolean mask"""
+    if len(mask) == 0:
+        return []
+    starts, ends = _mask_run_bounds(mask)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _category_runs(categories: np.ndarray, n_categories: int) -> List[List[Tuple[int, int]]]:
+    """Split a small-integer category array into runs and group the (start, end) pairs by category.
+
+    One pass finds every change point, so all categories are resolved together instead of
+    scanning a separate boolean mask per category.
+    """
+    if len(categories) == 0:
+        return [[] for _ in range(n_categories)]
+    change = np.flatnonzero(categories[1:] != categories[:-1]) + 1
+    starts = np.r_[0, change]
+    ends = np.r_[change - 1, len(categories) - 1]
+    run_categories = categories[starts]
+    runs = []
+    for c in range(n_categories):
+        selected = run_categories == c
+        runs.append(list(zip(starts[selected].tolist(), ends[selected].tolist())))
+    return runs
+
+
+def _depth_categories(depths: np.ndarray, min_safe_depth: int, nonzero: np.ndarray = None) -> np.ndarray:
+    """Classify each position as 0 = zero depth, 1 = low depth, 2 = normal depth (uint8).
+
+    A precomputed non-zero mask may be passed in; it is reused as the output buffer.
+    Zero depth is never "low" or "normal", so thresholds below 1 are treated as 1.
+    """
+    if nonzero is None:
+        nonzero = depths != 0
+    categories = nonzero.view(np.uint8)
+    categories += depths >= max(min_safe_depth, 1)
+    return categories
+
+
 class BedRegionParser:
     """Parse BED-format region file"""
 
@@ -30,6 +266,13 @@ class BedRegionParser:
 
     def parse_bed_regions(self) -> Dict[str, List[Tuple[int, int]]]:
         """Parse a BED file and return regions per chromosome"""
+        if pd is not None:
+            try:
+                return self._parse_bed_regions_pandas()
+            except ValueError:
+                # Irregular rows (e.g. track/browser lines); use the line parser
+                pass
+
         regions = defaultdict(list)
 
         with open(self.bed_file, 'r') as f:
@@ -49,105 +292,281 @@ class BedRegionParser:
 
         return dict(regions)
 
+    def _parse_bed_regions_pandas(self) -> Dict[str, List[Tuple[int, int]]]:
+        """Parse the first three BED columns with the pandas C tokenizer"""
+        # No NA parsing: contigs named 'NA'/'nan'/'null' are ordinary names here
+        df = pd.read_csv(self.bed_file, sep='\t', header=None, usecols=[0, 1, 2],
+                         dtype={0: 'category'}, keep_default_na=False, na_filter=False, engine='c')
+        # Only a leading '#' marks a comment line, as in the line parser
+        comments = df[0].str.startswith('#')
+        if comments.any():
+            df = df[~comments]
+        df = df.astype({1: np.int64, 2: np.int64}).sort_values([0, 1, 2])
+        return {chrom: list(zip(g[1].tolist(), g[2].tolist()))
+                for chrom, g in df.groupby(0, sort=False, observed=True)}
+
 class DepthParser:
     """Parse FASTA-like depth file"""
 
-    def __init__(self, depth_file: str):
+    def __init__(self, depth_file: str, cache_dir: str = None, gzip_buffer: int = _GZIP_BLOCK_SIZE):
         self.depth_file = depth_file
-        self.sequences = {}  # map: seq_id -> array.array('H')
+        self.sequences = {}  # map: seq_id -> np.ndarray (uint16)
         self.mean_depths = {}  # average depth per sequence
-        # self.index no longer needed; we work directly with array.array or its NumPy conversion
+        # Optional directory for parsed arrays (.npy), memory-mapped on later runs
+        self.cache_dir = cache_dir
+        # Decompression buffer size for .gz depth files
+        self.gzip_buffer = gzip_buffer
 
-    def parse_depth_file_filtered(self, target_sequences: set) -> Dict[str, array]: # return type is array.array
-        """Parse the depth file for the specified target sequences and store depths in array.array"""
-        # The sequences dict will store array.array objects
-        current_seq = None
-        # Use 'H' for unsigned short (0-65535). If depth can exceed this range, choose another type code such as 'L', 'i', or 'l'.
-        # depths_list = [] # no longer use python list
-        current_depth_array = None
-        include_current = False
+    def parse_depth_file_filtered(self, target_sequences: set,
+                                  seq_lengths: Dict[str, int] = None) -> Dict[str, np.ndarray]:
+        """Parse the depth file for the specified target sequences and store depths as np.uint16 arrays.
 
-        opener = gzip.open if self.depth_file.endswith('.gz') else open
+        seq_lengths (e.g. from FAIParser) lets each sequence be parsed into one preallocated buffer.
+        Flat binary layouts written by convert_depth_file (.u16) are memory-mapped instead.
+        """
+        if _is_binary_layout(self.depth_file):
+            self._load_binary_layout(target_sequences)
+            print(f"Mapped depth data for {len(self.sequences)} sequences from binary layout: {self.depth_file}")
+            return self.sequences
+
+        cache_path = self._cache_path()
+        if cache_path and self._load_cache(cache_path, target_sequences):
+            print(f"Loaded depth data for {len(self.sequences)} sequences from cache: {cache_path}")
+            return self.sequences
 
         print(f"Start parsing depth file: {self.depth_file}")
         print(f"Number of target sequences: {len(target_sequences)}")
 
         processed_count = 0
         skipped_count = 0
+        file_sequences = []
 
-        with opener(self.depth_file, 'rt') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('>'):
-                    if current_seq and current_depth_array is not None and include_current:
-                        self.sequences[current_seq] = current_depth_array
-                        # For average depth, convert to NumPy array or sum incrementally.
-                        # For efficiency with large data, compute later when needed.
-                        # Here we store first and compute in get_mean_depth.
-                        processed_count += 1
-                        if processed_count > 0 and processed_count % 5 == 0:
-                            print(f"Collected depth data for {processed_count} target sequences...")
-                    elif current_seq and not include_current:
-                        skipped_count += 1
-
-                    current_seq = line[1:]
-                    include_current = current_seq in target_sequences
-                    if include_current:
-                        current_depth_array = array('H') # 为新序列创建新的 array
-                    else:
-                        current_depth_array = None # 如果不包含，则不创建 array
-
-                elif include_current and current_depth_array is not None:
-                    try:
-                        depth = int(line)
-                        # For 'H', ensure values are in 0-65535, otherwise OverflowError.
-                        # Add checks/clamping or choose a more appropriate data type.
-                        if 0 <= depth <= 65535:
-                            current_depth_array.append(depth)
-                        elif depth > 65535:
-                             current_depth_array.append(65535) # Cap at max value for 'H'
-                        # else: ignore negative or very small values if not applicable
-                    except ValueError:
-                        continue
-
-            if current_seq and current_depth_array is not None and include_current:
-                self.sequences[current_seq] = current_depth_array
-                processed_count += 1
-            elif current_seq and not include_current:
+        for seq_id, depth_buffer in self._parse_chunks(target_sequences, seq_lengths or {}):
+            file_sequences.append(seq_id)
+            if depth_buffer is None:
                 skipped_count += 1
+                continue
+            self.sequences[seq_id] = depth_buffer.result()
+            self.mean_depths[seq_id] = depth_buffer.mean()
+            processed_count += 1
+            if processed_count % 5 == 0:
+                print(f"Collected depth data for {processed_count} target sequences...")
 
         print(f"Parsing completed: collected depth data for {processed_count} sequences, skipped {skipped_count} sequences")
-        # Compute and store mean depths
-        for seq_id, arr in self.sequences.items():
-            if len(arr) > 0:
-                # np.mean may be inefficient or unsupported on array.array; convert to NumPy array
-                self.mean_depths[seq_id] = np.mean(np.array(arr, dtype=np.float32)) # use float32 for mean
-            else:
-                self.mean_depths[seq_id] = 0.0
-        return self.sequences # return a dict containing array.array objects
+        if cache_path:
+            self._save_cache(cache_path, file_sequences)
+        return self.sequences
+
+    def _cache_path(self) -> Optional[str]:
+        """Cache directory for this depth file, keyed by its absolute path, size and mtime"""
+        if not self.cache_dir:
+            return None
+        st = os.stat(self.depth_file)
+        key = f"{os.path.abspath(self.depth_file)}\t{st.st_size}\t{st.st_mtime_ns}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    @staticmethod
+    def _cache_file(cache_path: str, seq_id: str) -> str:
+        return os.path.join(cache_path, hashlib.sha1(seq_id.encode()).hexdigest() + '.npy')
+
+    def _load_cache(self, cache_path: str, target_sequences: set) -> bool:
+        """Memory-map cached arrays for all targets; return False if any target is missing or damaged"""
+        manifest_file = os.path.join(cache_path, 'manifest.json')
+        if not os.path.exists(manifest_file):
+            return False
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+            means = manifest['means']
+            # Targets absent from the depth file need no cache entry
+            wanted = target_sequences & set(manifest['sequences'])
+            if not all(seq_id in means for seq_id in wanted):
+                return False
+            sequences = {seq_id: np.load(self._cache_file(cache_path, seq_id), mmap_mode='r')
+                         for seq_id in wanted}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: ignoring damaged depth cache {cache_path}: {e}")
+            return False
+        self.sequences.update(sequences)
+        for seq_id in wanted:
+            self.mean_depths[seq_id] = means[seq_id]
+        return True
 
-    # The parse_depth_file method should be similarly updated or marked deprecated/internal.
-    # For brevity, we omit changes to parse_depth_file and assume the filtered version is primarily used.
+    @staticmethod
+    def _read_cached_means(manifest_file: str) -> Dict[str, float]:
+        """Means recorded in an existing manifest; empty if it is missing or unreadable"""
+        try:
+            with open(manifest_file, 'r') as f:
+                return dict(json.load(f)['means'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    @staticmethod
+    def _replace_atomically(path: str, mode: str, write):
+        """Write via a uniquely named temp file in the same directory, then rename over path.
+
+        Unique names keep concurrent writers (e.g. two readers parsing the same file)
+        from clobbering each other's partial output.
+        """
+        tmp = tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(path), suffix='.tmp', delete=False)
+        try:
+            with tmp:
+                write(tmp)
+            os.replace(tmp.name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp.name)
+            except OSError:
+                pass
+            raise
+
+    def _save_cache(self, cache_path: str, file_sequences: List[str]):
+        """Save newly parsed arrays as .npy files and record them in the cache manifest"""
+        manifest_file = os.path.join(cache_path, 'manifest.json')
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            means = self._read_cached_means(manifest_file)
+            for seq_id, arr in self.sequences.items():
+                npy_file = self._cache_file(cache_path, seq_id)
+                if seq_id in means and os.path.exists(npy_file):
+                    continue
+                self._replace_atomically(npy_file, 'wb', lambda f: np.save(f, arr))
+                means[seq_id] = self.mean_depths[seq_id]
+            # Merge with entries another process/thread may have recorded meanwhile
+            means = {**self._read_cached_means(manifest_file), **means}
+            manifest = {'depth_file': os.path.abspath(self.depth_file),
+                        'sequences': file_sequences, 'means': means}
+            self._replace_atomically(manifest_file, 'w', lambda f: json.dump(manifest, f))
+        except OSError as e:
+            print(f"Warning: failed to write depth cache {cache_path}: {e}")
+
+    def _load_binary_layout(self, target_sequences: set):
+        """Map target sequences as zero-copy slices of a .u16 flat binary layout"""
+        if os.path.getsize(self.depth_file) == 0:
+            depths = _EMPTY_U16
+        else:
+            depths = np.memmap(self.depth_file, dtype='<u2', mode='r')
+        with open(self.depth_file + '.idx', 'r') as f:
+            for line in f:
+                seq_id, offset, length, mean = line.rstrip('\n').split('\t')
+                if seq_id in target_sequences:
+                    offset = int(offset)
+                    self.sequences[seq_id] = depths[offset:offset + int(length)]
+                    self.mean_depths[seq_id] = float(mean)
+
+    def _parse_chunks(self, target_sequences: set, seq_lengths: Dict[str, int]):
+        """Scan the depth file in fixed-size byte chunks and yield (seq_id, _DepthBuffer) per sequence.
+
+        Numeric runs between headers are tokenized by NumPy in C instead of one
+        int() call per base. Sequences not in target_sequences yield None.
+        Targets with a known length share one contiguous uint16 allocation; each
+        sequence's array is a view of its slice.
+        """
+        slices = {}
+        known = sorted(seq_id for seq_id in target_sequences if seq_lengths.get(seq_id))
+        if known:
+            arena = np.empty(sum(seq_lengths[seq_id] for seq_id in known), dtype=np.uint16)
+            offset = 0
+            for seq_id in known:
+                slices[seq_id] = arena[offset:offset + seq_lengths[seq_id]]
+                offset += seq_lengths[seq_id]
+
+        current_seq = None
+        include_current = False
+        depth_buffer = None
+
+        with _open_depth_file(self.depth_file, self.gzip_buffer) as f:
+            for buf, cut in _depth_windows(f, mappable=not self.depth_file.endswith('.gz')):
+                pos = 0
+                while pos < cut:
+                    if buf[pos] == 0x3E:  # '>' header line
+                        eol = buf.find(b'\n', pos, cut)
+                        if eol < 0:
+                            eol = cut
+                        if current_seq is not None:
+                            yield current_seq, depth_buffer
+                        current_seq = buf[pos + 1:eol].strip().decode()
+                        include_current = current_seq in target_sequences
+                        depth_buffer = _DepthBuffer(buffer=slices.get(current_seq)) if include_current else None
+                        pos = eol + 1
+                        continue
+                    # Numeric body runs until the next header (or the end of this window)
+                    next_header = buf.find(b'\n>', pos, cut)
+                    end = cut if next_header < 0 else next_header + 1
+                    # Tokenize at most _CHUNK_SIZE bytes at a time, split on line boundaries
+                    while include_current and pos < end:
+                        stop = end
+                        if end - pos > _CHUNK_SIZE:
+                            stop = buf.rfind(b'\n', pos, pos + _CHUNK_SIZE) + 1 or end
+                        depth_buffer.append(_parse_depth_block(buf[pos:stop]))
+                        pos = stop
+                    pos = end
+
+        if current_seq is not None:
+            yield current_seq, depth_buffer
 
     def get_region_depths(self, seq_id: str, start: int, end: int) -> np.ndarray:
-        """Quickly get depth data for a region and return a NumPy array"""
+        """Quickly get depth data for a region as a zero-copy np.uint16 view"""
         if seq_id not in self.sequences:
-            return np.array([])
+            return _EMPTY_U16
 
         depth_array_obj = self.sequences[seq_id]
-        # Slice the array.array object, then convert to a NumPy array
         # Ensure start and end fall within valid bounds
         actual_start = max(0, start)
         actual_end = min(len(depth_array_obj), end + 1)
         if actual_start >= actual_end: # region invalid or empty
-            return np.array([])
+            return _EMPTY_U16
 
-        return np.array(depth_array_obj[actual_start:actual_end], dtype=np.int32)
+        return depth_array_obj[actual_start:actual_end]
 
     def get_mean_depth(self, seq_id: str) -> float:
         """Get average depth for a sequence"""
         return self.mean_depths.get(seq_id, 0.0)
 
+class _AllSequences:
+    """Target set that matches every sequence, used to parse a whole depth file"""
+
+    def __contains__(self, seq_id):
+        return True
+
+    def __iter__(self):
+        return iter(())
+
+
+def _is_binary_layout(path: str) -> bool:
+    return path.endswith('.u16') and os.path.exists(path + '.idx')
+
+
+def convert_depth_file(depth_file: str, output_path: str, gzip_buffer: int = _GZIP_BLOCK_SIZE) -> str:
+    """Convert a text depth file (optionally .gz) into a flat binary layout.
+
+    Depths of all sequences are written back to back as little-endian uint16 to
+    output_path (which should end in .u16), and output_path + '.idx' lists one
+    "seq_id<TAB>offset<TAB>length<TAB>mean" row per sequence. DepthParser memory-maps
+    such files directly, so later runs skip decompression and parsing.
+    """
+    parser = DepthParser(depth_file, gzip_buffer=gzip_buffer)
+    index_rows = []
+    offset = 0
+    with open(output_path + '.tmp', 'wb') as out:
+        for seq_id, depth_buffer in parser._parse_chunks(_AllSequences(), {}):
+            depths = depth_buffer.result().astype('<u2', copy=False)
+            depths.tofile(out)
+            index_rows.append(f"{seq_id}\t{offset}\t{len(depths)}\t{depth_buffer.mean()!r}\n")
+            offset += len(depths)
+    with open(output_path + '.idx.tmp', 'w') as f:
+        f.writelines(index_rows)
+    os.replace(output_path + '.tmp', output_path)
+    os.replace(output_path + '.idx.tmp', output_path + '.idx')
+    return output_path
+
+
+@lru_cache(maxsize=32)
+def _cached_fai_lengths(path: str, size: int, mtime_ns: int) -> Dict[str, int]:
+    """FAI lengths memoized per (path, size, mtime); FAI files are re-read by every run() in a process"""
+    return FAIParser(path)._parse_fai()
+
+
 class FAIParser:
     """Parse FAI index file"""
 
@@ -156,6 +575,17 @@ class FAIParser:
 
     def parse_fai(self) -> Dict[str, int]:
         """Parse FAI file and return a mapping from sequence ID to length"""
+        st = os.stat(self.fai_file)
+        return dict(_cached_fai_lengths(os.path.abspath(self.fai_file), st.st_size, st.st_mtime_ns))
+
+    def _parse_fai(self) -> Dict[str, int]:
+        if pd is not None:
+            try:
+                return self._parse_fai_pandas()
+            except ValueError:
+                # Malformed rows; use the line parser
+                pass
+
         seq_lengths = {}
 
         with open(self.fai_file, 'r') as f:
@@ -168,6 +598,14 @@ class FAIParser:
 
         return seq_lengths
 
+    def _parse_fai_pandas(self) -> Dict[str, int]:
+        """Parse the name and length columns with the pandas C tokenizer"""
+        # No NA parsing: a contig named 'NA'/'nan'/'null' must keep its name
+        df = pd.read_csv(self.fai_file, sep='\t', header=None, usecols=[0, 1],
+                         dtype={0: str, 1: np.int64}, keep_default_na=False, na_filter=False,
+                         engine='c')
+        return dict(zip(df[0].tolist(), df[1].tolist()))
+
 class SlidingWindowProcessor:
     """Sliding window processing and merging"""
 
@@ -179,87 +617,54 @@ class SlidingWindowProcessor:
 
         # If input is array.array, convert to NumPy array first
         if isinstance(depths_input, array):
-            depths = np.array(depths_input, dtype=np.int32) # choose dtype as needed
+            # array('H') is the parser's uint16 layout: view it without copying
+            if depths_input.typecode == 'H':
+                depths = np.frombuffer(depths_input, dtype=np.uint16)
+            else:
+                depths = np.array(depths_input, dtype=np.int64)
         elif isinstance(depths_input, np.ndarray):
             depths = depths_input
         else:
             raise TypeError("Input depths must be an array.array or numpy.ndarray")
 
         if len(depths) == 0:
-            return np.array([]), np.array([])
-
-        # Use NumPy convolution for fast sliding-window calculation
-        kernel = np.ones(self.window_size) / self.window_size
+            return _EMPTY_I64, _EMPTY_F64
 
         # 处理边界情况
         if len(depths) < self.window_size:
             # If depth length is smaller than window size, take the region's average as a single point
             avg_depths = np.array([np.mean(depths)])
             # Set position to the center of the region
-            positions = np.array([len(depths) // 2]) 
+            positions = np.array([len(depths) // 2])
         else:
-            # Use 'valid' mode to avoid edge effects
-            avg_depths = np.convolve(depths, kernel, mode='valid')
-            # Compute window-center positions.
-            # The first valid window covers depths[0:window_size], center at (window_size - 1) // 2.
-            # The last valid window covers depths[len(depths)-window_size : len(depths)],
-            # center at (len(depths) - window_size) + (window_size - 1) // 2.
-            # avg_depths length is len(depths) - self.window_size + 1 and positions should match.
-            start_pos = (self.window_size - 1) // 2
-            # Center of the last valid window
-            # Last window starts at len(depths) - self.window_size,
-            # its center is (len(depths) - self.window_size) + (self.window_size - 1) // 2
-            end_pos = (len(depths) - self.window_size) + (self.window_size - 1) // 2
-
-            # 如果 avg_depths 为空 (例如 window_size > len(depths) 但不满足 len(depths) < self.window_size 的初始条件)
-            if len(avg_depths) == 0:
-                # This should not happen because we handled len(depths) < self.window_size above,
-                # but keep a safeguard
-                if len(depths) > 0:
-                    avg_depths = np.array([np.mean(depths)])
-                    positions = np.array([len(depths) // 2])
-                else:
-                    return np.array([]), np.array([]) # return empty if depths is empty
-            else:
-                 # Positions are the center index for each valid window:
-                 # depths[0:window_size] -> (window_size-1)//2
-                 # depths[1:window_size+1] -> 1 + (window_size-1)//2
-                 # ...
-                 # depths[L-W : L] -> (L-W) + (window_size-1)//2 where L=len(depths), W=window_size
-                num_valid_windows = len(depths) - self.window_size + 1
-                positions = np.arange(num_valid_windows) + (self.window_size -1) // 2
+            # Uniform moving average via a prefix sum: each window mean is
+            # (c[i+W] - c[i]) / W, so the cost is O(N) instead of O(N*W) for np.convolve.
+            # Only 'valid' windows are produced, avoiding edge effects.
+            c = np.empty(len(depths) + 1, dtype=np.float64)
+            c[0] = 0.0
+            np.cumsum(depths, dtype=np.float64, out=c[1:])
+            avg_depths = (c[self.window_size:] - c[:-self.window_size]) * (1.0 / self.window_size)
+            # Positions are the center index for each valid window:
+            # depths[0:W] -> (W-1)//2, ..., depths[L-W:L] -> (L-W) + (W-1)//2
+            positions = np.arange(len(avg_depths)) + (self.window_size - 1) // 2
 
         return positions, avg_depths
 
     def merge_consecutive_windows(self, positions: np.ndarray,
                                 depths: np.ndarray) -> Tuple[List[Tuple[int, int]], List[float]]:
-        """Merge consecutive windows with similar depths"""
+        """Merge consecutive windows whose depths round to the same integer"""
         if len(depths) == 0:
             return [], []
 
-        merged_regions = []
-        merged_depths = []
+        # Windows whose means round to the same integer depth belong to one run;
+        # integer equality is exact, unlike a floating-point tolerance
+        quantized = np.rint(depths).astype(np.int32)
+        breaks = np.flatnonzero(np.diff(quantized)) + 1
+        group_starts = np.r_[0, breaks]
+        group_ends = np.r_[breaks - 1, len(depths) - 1]
 
-        current_start = positions[0]
-        current_depth = depths[0]
-        current_end = positions[0]
-
-        for i in range(1, len(depths)):
-            if abs(depths[i] - current_depth) < 0.1:  # allow small floating-point error
-                current_end = positions[i]
-            else:
-                # save current region
-                merged_regions.append((current_start, current_end))
-                merged_depths.append(current_depth)
-
-                # start a new region
-                current_start = positions[i]
-                current_depth = depths[i]
-                current_end = positions[i]
-
-        # save the last region
-        merged_regions.append((current_start, current_end))
-        merged_depths.append(current_depth)
+        merged_regions = list(zip(positions[group_starts].tolist(), positions[group_ends].tolist()))
+        merged_depths = depths[group_starts].tolist()
 
         return merged_regions, merged_depths
 
@@ -271,20 +676,19 @@ class DepthRegionAnalyzer:
 
     def analyze_depth_regions(self, hifi_depths: np.ndarray, ont_depths: np.ndarray):
         """Analyze depth data to identify zero-depth, low-depth, and normal regions"""
-        # Combine HiFi and ONT depths for analysis
+        # Combine HiFi and ONT depths for analysis (int32 sum, so uint16 inputs cannot overflow)
         if len(ont_depths) > 0 and len(hifi_depths) > 0:
-            combined_depths = hifi_depths + ont_depths
+            combined_depths = np.add(hifi_depths, ont_depths, dtype=np.int32)
         elif len(ont_depths) > 0:
             combined_depths = ont_depths
         else:
             combined_depths = hifi_depths
 
+        # Classify each position once: 0 = zero depth, 1 = low depth, 2 = normal depth
+        categories = _depth_categories(combined_depths, self.min_safe_depth)
+
         # Find different types of regions
-        zero_depth_regions = self._find_continuous_regions(combined_depths == 0)
-        low_depth_regions = self._find_continuous_regions(
-            (combined_depths > 0) & (combined_depths < self.min_safe_depth)
-        )
-        normal_depth_regions = self._find_continuous_regions(combined_depths >= self.min_safe_depth)
+        zero_depth_regions, low_depth_regions, normal_depth_regions = _category_runs(categories, 3)
 
         return {
             'zero_depth': zero_depth_regions,
@@ -294,24 +698,7 @@ class DepthRegionAnalyzer:
 
     def _find_continuous_regions(self, mask: np.ndarray):
         """Find continuous regions where mask is True"""
-        if len(mask) == 0:
-            return []
-
-        regions = []
-        start = None
-
-        for i, value in enumerate(mask):
-            if value and start is None:
-                start = i
-            elif not value and start is not None:
-                regions.append((start, i - 1))
-                start = None
-
-        # Handle case where region extends to the end
-        if start is not None:
-            regions.append((start, len(mask) - 1))
-
-        return regions
+        return _mask_runs(mask)
 
 class DataProcessor:
     """Unified data processor for a single type of depth data"""
@@ -324,92 +711,127 @@ class DataProcessor:
     def calculate_windowed_stats(self, depths: np.ndarray):
         """Compute window statistics"""
         if len(depths) == 0:
-            return np.array([]), np.array([]), np.array([])
+            return _EMPTY_F64, _EMPTY_I64, _EMPTY_I64
+        sums, starts, ends = self._windowed_sums(depths, depths != 0)
+        return self._sums_to_means(sums, starts, ends), starts, ends
 
-        # Find non-zero segments
-        zero_mask = (depths == 0)
-        segments = self._find_non_zero_segments(depths, zero_mask)
-
-        all_means = []
-        all_starts = []
-        all_ends = []
-
-        for segment_start, segment_end in segments:
-            segment_depths = depths[segment_start:segment_end+1]
-            segment_length = len(segment_depths)
-
-            if segment_length == 0:
-                continue
-
-            num_windows = max(1, segment_length // self.window_size)
-            if segment_length % self.window_size != 0:
-                num_windows += 1
+    def process(self, depths: np.ndarray, min_safe_depth: int = 5) -> dict:
+        """Compute window statistics, depth regions and the non-zero average in one go.
 
-            for i in range(num_windows):
-                window_start_in_segment = i * self.window_size
-                window_end_in_segment = min((i + 1) * self.window_size, segment_length)
+        The non-zero mask is built once and shared: it yields the windowed segments, the
+        zero/low classification and the non-zero count, and the window sums give the total.
+        """
+        if len(depths) == 0:
+            return {'means': _EMPTY_F64, 'starts': _EMPTY_I64, 'ends': _EMPTY_I64,
+                    'regions': {'zero': [], 'low': []}, 'nonzero_avg': 0.0}
 
-                abs_start = segment_start + window_start_in_segment
-                abs_end = segment_start + window_end_in_segment - 1
+        nonzero = depths != 0
+        sums, starts, ends = self._windowed_sums(depths, nonzero)
+        count = np.count_nonzero(nonzero)
+        avg = float(sums.sum()) / count if count else 0.0
 
-                window_data = segment_depths[window_start_in_segment:window_end_in_segment]
-                if len(window_data) > 0:
-                    all_means.append(np.mean(window_data))
-                    all_starts.append(abs_start)
-                    all_ends.append(abs_end)
+        # Reuse the mask as the category array: 0 = zero depth, 1 = low depth, 2 = normal depth
+        categories = _depth_categories(depths, min_safe_depth, nonzero)
+        zero_regions, low_regions, _ = _category_runs(categories, 3)
 
-        return np.array(all_means), np.array(all_starts), np.array(all_ends)
+        return {'means': self._sums_to_means(sums, starts, ends), 'starts': starts, 'ends': ends,
+                'regions': {'zero': zero_regions, 'low': low_regions}, 'nonzero_avg': avg}
 
-    def _find_non_zero_segments(self, depths: np.ndarray, zero_mask: np.ndarray):
-        """Find continuous non-zero segments"""
-        segments = []
-        start = None
+    def _windowed_sums(self, depths: np.ndarray, nonzero: np.ndarray):
+        """Return per-window depth sums with inclusive window starts and ends"""
+        # Find non-zero segments
+        seg_starts, seg_ends = _mask_run_bounds(nonzero)
+        if len(seg_starts) == 0:
+            return _EMPTY_F64, _EMPTY_I64, _EMPTY_I64
+
+        # Tile every segment with windows of window_size starting at the segment start;
+        # the last window of a segment is truncated at the segment end
+        window_size = self.window_size
+        seg_windows = (seg_ends - seg_starts + window_size) // window_size
+        seg_index = np.repeat(np.arange(len(seg_starts)), seg_windows)
+        first_window = np.cumsum(seg_windows) - seg_windows
+        # Build starts/ends in place to keep full-length temporaries to a minimum
+        starts = np.arange(seg_windows.sum())
+        starts -= first_window[seg_index]
+        starts *= window_size
+        starts += seg_starts[seg_index]
+        ends = starts + (window_size - 1)
+        np.minimum(ends, seg_ends[seg_index], out=ends)
+
+        if len(seg_starts) <= _BLOCK_SUM_MAX_SEGMENTS and depths.dtype.kind in 'iub':
+            sums = self._block_sums(depths, seg_starts, seg_ends, seg_windows)
+        else:
+            # One C-level reduction for all windows. Each reduceat slice runs up to the next
+            # window start, which only adds the zero-depth gap between segments to the sum.
+            sums = np.add.reduceat(depths, starts, dtype=np.float64)
 
-        for i, is_zero in enumerate(zero_mask):
-            if not is_zero and start is None:
-                start = i
-            elif is_zero and start is not None:
-                segments.append((start, i - 1))
-                start = None
+        return sums, starts, ends
 
-        if start is not None:
-            segments.append((start, len(depths) - 1))
+    def _block_sums(self, depths, seg_starts, seg_ends, seg_windows) -> np.ndarray:
+        """Window sums for few, long segments: full windows are summed as rows of a 2-D view.
 
-        return segments
+        A row-wise integer sum vectorizes much better than reduceat's sequential float
+        accumulation, and integer sums convert to float64 exactly, so results are identical.
+        """
+        window_size = self.window_size
+        sums = np.empty(int(seg_windows.sum()), dtype=np.float64)
+        pos = 0
+        for seg_start, seg_end, n_windows in zip(seg_starts.tolist(), seg_ends.tolist(), seg_windows.tolist()):
+            n_full = (seg_end - seg_start + 1) // window_size
+            full_end = seg_start + n_full * window_size
+            if n_full:
+                block = depths[seg_start:full_end].reshape(n_full, window_size)
+                sums[pos:pos + n_full] = block.sum(axis=1, dtype=np.int64)
+            if n_windows > n_full:
+                sums[pos + n_full] = depths[full_end:seg_end + 1].sum(dtype=np.int64)
+            pos += n_windows
+        return sums
+
+    @staticmethod
+    def _sums_to_means(sums: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Turn window sums into means, dividing in place (sums is a fresh array)"""
+        if len(sums) == 0:
+            return sums
+        widths = ends - starts
+        widths += 1
+        return np.divide(sums, widths, out=sums)
 
     def analyze_depth_regions(self, depths: np.ndarray, min_safe_depth: int = 5):
         """Analyze depth regions (standalone), including zero-depth regions"""
         if len(depths) == 0:
             return {'zero': [], 'low': [], 'medium': []}
 
-        # Define depth thresholds
-        low_threshold = min_safe_depth
-
-        # Create masks
-        zero_mask = depths == 0
-        low_mask = (depths > 0) & (depths < low_threshold)
+        # One classification pass instead of separate zero and low masks
+        zero_regions, low_regions, _ = _category_runs(_depth_categories(depths, min_safe_depth), 3)
 
         return {
-            'zero': self._mask_to_regions(zero_mask),
-            'low': self._mask_to_regions(low_mask),
+            'zero': zero_regions,
+            'low': low_regions,
         }
 
     def _mask_to_regions(self, mask: np.ndarray):
         """Convert a boolean mask to a list of regions"""
-        regions = []
-        start = None
+        return _mask_runs(mask)
+
+_worker_plotter = None
 
-        for i, value in enumerate(mask):
-            if value and start is None:
-                start = i
-            elif not value and start is not None:
-                regions.append((start, i - 1))
-                start = None
 
-        if start is not None:
-            regions.append((start, len(mask) - 1))
+def _init_plot_worker(plotter):
+    """Pool initializer: keep one plotter (and so one reusable figure) per worker process"""
+    global _worker_plotter
+    _worker_plotter = plotter
+
+
+def _plot_one(plot_kwargs, plotter=None):
+    """Worker entry point for DepthPlotter.plot_many: plot one region, return None on failure"""
+    if plotter is None:
+        plotter = _worker_plotter
+    try:
+        return plotter.plot_single_sequence(**plot_kwargs)
+    except Exception as e:
+        print(f"Error plotting sequence {plot_kwargs.get('seq_id')}: {e}")
+        return None
 
-        return regions
 
 class DepthPlotter:
     def __init__(self, hifi_color: str = '#2ca25f', ont_color: str = '#3C5488',
@@ -422,6 +844,30 @@ class DepthPlotter:
         self.dpi = dpi
         self.output_dir = '.'
         self.max_depth_ratio = max_depth_ratio
+        self._fig = None
+        self._ax = None
+
+    def __getstate__(self):
+        # the cached figure is process-local; workers build their own
+        state = self.__dict__.copy()
+        state['_fig'] = None
+        state['_ax'] = None
+        return state
+
+    def _get_axes(self):
+        """Return the reusable figure and a cleared axes, creating them on first use"""
+        if self._fig is None:
+            self._fig, self._ax = plt.subplots(figsize=self.figure_size, dpi=self.dpi)
+        else:
+            self._ax.clear()
+        return self._fig, self._ax
+
+    def close(self):
+        """Release the cached figure"""
+        if self._fig is not None:
+            plt.close(self._fig)
+        self._fig = None
+        self._ax = None
 
     def _setup_plot_properties(self, ax, seq_id: str, seq_length: int, plot_mode: str, avg_depth: float = None):
         """set basic plot properties"""
@@ -471,8 +917,8 @@ class DepthPlotter:
         """plot depth plot for single sequence, support 3 models"""
 
         # convert to numpy
-        hifi_depths_array = np.array(hifi_depths) if hifi_depths is not None else np.array([])
-        ont_depths_array = np.array(ont_depths) if ont_depths is not None else np.array([])
+        hifi_depths_array = np.asarray(hifi_depths) if hifi_depths is not None else _EMPTY_F64
+        ont_depths_array = np.asarray(ont_depths) if ont_depths is not None else _EMPTY_F64
 
         # check data valid
         has_hifi = len(hifi_depths_array) > 0
@@ -499,7 +945,7 @@ class DepthPlotter:
         if has_ont:
             processors['ont'] = DataProcessor('ont', self.ont_color, window_size)
 
-        # processing data
+        # processing data: windowed means, depth categories and non-zero average per dataset
         processed_data = {}
         for data_type, processor in processors.items():
             if data_type == 'hifi':
@@ -507,19 +953,8 @@ class DepthPlotter:
             else:
                 depths = ont_depths_array
 
-            # calculate depth by windows
-            means, starts, ends = processor.calculate_windowed_stats(depths)
-
-            # analyze depth categories
-            depth_regions = processor.analyze_depth_regions(depths, min_safe_depth)
-
-            processed_data[data_type] = {
-                'means': means,
-                'starts': starts,
-                'ends': ends,
-                'regions': depth_regions,
-                'processor': processor
-            }
+            processed_data[data_type] = processor.process(depths, min_safe_depth)
+            processed_data[data_type]['processor'] = processor
 
         # set plot mode
         if has_hifi and has_ont:
@@ -529,8 +964,8 @@ class DepthPlotter:
         else:
             plot_mode = 'ont_only'  # only ONT, Y is positive
 
-        # create a figure
-        fig, ax = plt.subplots(figsize=self.figure_size, dpi=self.dpi)
+        # reuse the figure across calls; creating one per region dominates small plots
+        fig, ax = self._get_axes()
 
         # ploting based on mode
         if plot_mode == 'both':
@@ -541,14 +976,8 @@ class DepthPlotter:
             self._plot_single_data(ax, processed_data['ont'], seq_length)
 
         # dataset-specific averages (exclude zero-depth)
-        hifi_avg = float(np.mean(hifi_depths_array[hifi_depths_array > 0])) if has_hifi and np.any(hifi_depths_array > 0) else 0.0
-        ont_avg = float(np.mean(ont_depths_array[ont_depths_array > 0])) if has_ont and np.any(ont_depths_array > 0) else 0.0
-
-        # store per-dataset avg for plotting/clamping
-        if has_hifi:
-            processed_data['hifi']['avg'] = hifi_avg
-        if has_ont:
-            processed_data['ont']['avg'] = ont_avg
+        hifi_avg = processed_data['hifi']['nonzero_avg'] if has_hifi else 0.0
+        ont_avg = processed_data['ont']['nonzero_avg'] if has_ont else 0.0
 
         # choose average for y-limit: per dataset or max of both
         if plot_mode == 'both':
@@ -567,11 +996,39 @@ class DepthPlotter:
         # save plot
         output_path = self._save_plot(fig, seq_id, regions, output_dir)
 
-        # close plot
-        plt.close(fig)
-
         return output_path
 
+    def plot_many(self, tasks: List[dict], max_workers: int = None) -> List[Optional[str]]:
+        """Plot many regions, one plot_single_sequence call per task (keyword-argument dict).
+
+        Returns the output path (or None on failure) for each task, in order.
+        """
+        results = [None] * len(tasks)
+        for index, result in self.iter_plots(tasks, max_workers):
+            results[index] = result
+        return results
+
+    def iter_plots(self, tasks: List[dict], max_workers: int = None):
+        """Plot tasks and yield (task index, output path or None) as each plot finishes.
+
+        Tasks are independent, so with max_workers > 1 they are dispatched to a process
+        pool (never larger than the number of tasks). Depth arrays are passed as NumPy
+        arrays, which pickle as a flat buffer copy.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = min(max_workers, len(tasks))
+        if max_workers <= 1:
+            for index, kwargs in enumerate(tasks):
+                yield index, _plot_one(kwargs, self)
+            return
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_plot_worker,
+                                 initargs=(self,)) as executor:
+            futures = {executor.submit(_plot_one, kwargs): index for index, kwargs in enumerate(tasks)}
+            # Report plots in completion order so one large region does not hold back the rest
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
     def _plot_both_data(self, ax, processed_data, seq_length):
         """Plot HiFi (upper) and ONT (lower) data"""
         # for hifi, positive
@@ -602,9 +1059,6 @@ class DepthPlotter:
         if len(means) == 0:
             return
 
-        # calculate the middle position of any window
-        centers = (starts + ends) / 2
-
         # clamp to max ratio relative to dataset average if available
         if avg_ref and hasattr(self, 'max_depth_ratio') and self.max_depth_ratio is not None:
             cap = avg_ref * self.max_depth_ratio
@@ -615,9 +1069,18 @@ class DepthPlotter:
         # plot upper or lower
         plot_means = means_to_plot if positive else -means_to_plot
 
-        # plot bar 
-        widths = ends - starts + 1
-        ax.bar(centers, plot_means, width=widths, color=color, alpha=0.8, edgecolor='none')
+        # draw all windows as one filled step outline (same extent as a bar per window:
+        # start - 0.5 .. end + 0.5); a single artist instead of one Rectangle per window
+        n = len(plot_means)
+        xs = np.empty(4 * n, dtype=np.float64)
+        xs[0::4] = starts - 0.5
+        xs[1::4] = xs[0::4]
+        xs[2::4] = ends + 0.5
+        xs[3::4] = xs[2::4]
+        ys = np.zeros(4 * n, dtype=np.float64)
+        ys[1::4] = plot_means
+        ys[2::4] = plot_means
+        ax.fill_between(xs, 0, ys, color=color, alpha=0.8, linewidth=0)
 
         # add average line
         if len(means) > 0:
@@ -703,16 +1166,35 @@ class DepthPlotter:
         return output_path
 
 
+def _as_depth_array(depths) -> np.ndarray:
+    """Return parsed depths as a uint16 array without copying (shared empty array for None/empty)"""
+    if depths is None or len(depths) == 0:
+        return _EMPTY_U16
+    if isinstance(depths, array):
+        return np.frombuffer(depths, dtype=np.uint16)
+    return np.asarray(depths, dtype=np.uint16)
+
+
 class SynchronizedDepthReader:
     """Iterator for synchronized reading of two depth files"""
 
-    def __init__(self, hifi_file: str = None, ont_file: str = None, target_sequences: set = None, regions: dict = None):
+    def __init__(self, hifi_file: str = None, ont_file: str = None, target_sequences: set = None, regions: dict = None,
+                 seq_lengths: dict = None, cache_dir: str = None, verbose: bool = False,
+                 gzip_buffer: int = _GZIP_BLOCK_SIZE):
         self.hifi_file = hifi_file
         self.ont_file = ont_file
         self.target_sequences = target_sequences or set()
         self.regions = regions
-        # Add tracking of processed sequences
-        self.processed_sequences = set()
+        # Optional seq_id -> length map (from the FAI) used to preallocate depth buffers
+        self.seq_lengths = seq_lengths
+        # Optional parsed-depth cache directory forwarded to DepthParser
+        self.cache_dir = cache_dir
+        # Print a line per sequence instead of batched progress
+        self.verbose = verbose
+        # Decompression buffer size forwarded to DepthParser
+        self.gzip_buffer = gzip_buffer
+        # Number of sequences yielded by read_sequences
+        self.processed_count = 0
         self.total_target_sequences = len(self.target_sequences)
 
     def read_sequences(self):
@@ -721,55 +1203,64 @@ class SynchronizedDepthReader:
         This avoids fragile line-by-line synchronization and correctly handles
         cases where the two depth files have different sequence orders.
         """
-        # Parse HiFi and ONT depth files into maps: seq_id -> array('H')
-        hifi_map: Dict[str, array] = {}
-        ont_map: Dict[str, array] = {}
-
         targets = self.target_sequences if self.target_sequences else set()
 
-        if self.hifi_file:
-            try:
-                hifi_parser = DepthParser(self.hifi_file)
-                hifi_map = hifi_parser.parse_depth_file_filtered(targets) if targets else hifi_parser.parse_depth_file_filtered(set())
-            except Exception as e:
-                print(f"Warning: failed to parse HiFi depth file {self.hifi_file}: {e}")
-        if self.ont_file:
-            try:
-                ont_parser = DepthParser(self.ont_file)
-                ont_map = ont_parser.parse_depth_file_filtered(targets) if targets else ont_parser.parse_depth_file_filtered(set())
-            except Exception as e:
-                print(f"Warning: failed to parse ONT depth file {self.ont_file}: {e}")
-
-        # Determine which sequences to yield
-        if targets:
-            seq_ids = list(targets)
-        else:
-            seq_ids = list(set(hifi_map.keys()) | set(ont_map.keys()))
-
+        # Parse HiFi and ONT depth files into maps: seq_id -> np.ndarray (uint16).
+        # The files are independent, so parse them concurrently: decompression and
+        # NumPy tokenization of one overlap with disk reads of the other.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            hifi_future = executor.submit(self._parse_depth_file, self.hifi_file, 'HiFi', targets) if self.hifi_file else None
+            ont_future = executor.submit(self._parse_depth_file, self.ont_file, 'ONT', targets) if self.ont_file else None
+            hifi_map: Dict[str, np.ndarray] = hifi_future.result() if hifi_future else {}
+            ont_map: Dict[str, np.ndarray] = ont_future.result() if ont_future else {}
+
+        # Determine which sequences to yield: the targets (or everything parsed),
+        # restricted to sequences with regions when regions are given
+        seq_ids = set(targets) if targets else set(hifi_map) | set(ont_map)
+        if self.regions:
+            seq_ids &= set(self.regions)
+        seq_ids = list(seq_ids)
+
+        # Without verbose output, report progress about every 1% of sequences
+        total = len(seq_ids)
+        progress_step = max(1, total // 100)
+        processed = 0
         for seq_id in seq_ids:
-            if not self._should_process_sequence(seq_id):
-                continue
-            self.processed_sequences.add(seq_id)
-            hifi_arr = np.array(hifi_map.get(seq_id, array('H')), dtype=np.int32) if hifi_map.get(seq_id) is not None else np.array([])
-            ont_arr = np.array(ont_map.get(seq_id, array('H')), dtype=np.int32) if ont_map.get(seq_id) is not None else np.array([])
-            remaining = len(seq_ids) - len(self.processed_sequences)
-            print(f"Processing sequence: {seq_id}, remaining target sequences: {remaining}")
+            processed += 1
+            self.processed_count = processed
+            # Depths stay uint16 (zero-copy); downstream sums promote explicitly
+            hifi_arr = _as_depth_array(hifi_map.get(seq_id))
+            ont_arr = _as_depth_array(ont_map.get(seq_id))
+            if self.verbose:
+                print(f"Processing sequence: {seq_id}, remaining target sequences: {total - processed}")
+            elif processed == total or processed % progress_step == 0:
+                print(f"Read {processed}/{total} sequences")
             yield seq_id, hifi_arr, ont_arr
 
-        print(f"File reading ended, processed {len(self.processed_sequences)} sequences in total")
+        print(f"File reading ended, processed {processed} sequences in total")
+
+    def _parse_depth_file(self, depth_file: str, label: str, targets: set) -> Dict[str, np.ndarray]:
+        """Parse one depth file, returning an empty map (with a warning) on failure"""
+        try:
+            return DepthParser(depth_file, self.cache_dir, self.gzip_buffer).parse_depth_file_filtered(targets, self.seq_lengths)
+        except Exception as e:
+            print(f"Warning: failed to parse {label} depth file {depth_file}: {e}")
+            return {}
 
-    def _should_process_sequence(self, seq_id: str) -> bool:
-        """Determine whether this sequence should be processed"""
-        if self.target_sequences and seq_id not in self.target_sequences:
-            return False
-        if self.regions and seq_id not in self.regions:
-            return False
-        return True
+
+def _gzip_buffer_arg(value: str) -> int:
+    """argparse type for --gzip-buffer: an integer byte count of at least _MIN_GZIP_BUFFER"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if size < _MIN_GZIP_BUFFER:
+        raise argparse.ArgumentTypeError(f"must be at least {_MIN_GZIP_BUFFER} bytes, got {size}")
+    return size
 
 
 def main():
     # Argument parsing
-    import argparse
     parser = argparse.ArgumentParser(
         description='Depth data visualization tool - Enhanced version',
         formatter_class=argparse.RawDescriptionHelpFormatter
@@ -808,6 +1299,17 @@ def main():
     # New parameters
     parser.add_argument('--min-safe-depth', type=int, default=5,
                        help='Minimum safe depth threshold, regions below this value will be marked with blue background (default: 5)')
+    parser.add_argument('-t', '--threads', type=int, default=1,
+                       help='Number of worker processes used for plotting (default: 1)')
+    parser.add_argument('--cache-dir',
+                       help='Directory for caching parsed depth arrays; later runs memory-map them instead of re-parsing')
+    parser.add_argument('--convert-binary', metavar='DIR',
+                       help='Convert the given depth files to memory-mappable .u16 layouts in DIR and exit; '
+                            'pass the .u16 files as --hifi/--nano in later runs')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                       help='Report every sequence and generated image instead of batched progress')
+    parser.add_argument('--gzip-buffer', type=_gzip_buffer_arg, default=_GZIP_BLOCK_SIZE,
+                       help='Decompression buffer size in bytes for .gz depth files (minimum 4096, default: 1 MiB)')
 
     args = parser.parse_args()
 
@@ -816,8 +1318,19 @@ def main():
         print("Error: Must provide at least one depth file (--hifi or --nano)")
         return
 
+    # One-time conversion of text depth files to flat binary layouts
+    if args.convert_binary:
+        os.makedirs(args.convert_binary, exist_ok=True)
+        for depth_file in filter(None, (args.hifi, args.nano)):
+            name = os.path.basename(depth_file)
+            if name.endswith('.gz'):
+                name = name[:-3]
+            output_path = os.path.join(args.convert_binary, name + '.u16')
+            print(f"Converting {depth_file} -> {output_path}")
+            convert_depth_file(depth_file, output_path, args.gzip_buffer)
+        return
+
     # Create output directory
-    import os
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Parse fai file
@@ -839,16 +1352,15 @@ def main():
     # Parse single region parameter
     single_region = None
     if args.region:
-        try:
-            parts = args.region.split(':')
-            seq_id = parts[0]
-            start, end = map(int, parts[1].split('-'))
-            single_region = {seq_id: [(start, end)]}
-            target_sequences = {seq_id}
-            print(f"Will plot single specified region: {args.region}")
-        except:
+        match = _REGION_RE.match(args.region.strip())
+        if not match:
             print(f"Error: Invalid region format {args.region}")
             return
+        seq_id = match.group(1)
+        start, end = int(match.group(2)), int(match.group(3))
+        single_region = {seq_id: [(start, end)]}
+        target_sequences = {seq_id}
+        print(f"Will plot single specified region: {args.region}")
 
     # Prioritize single region, otherwise use BED file regions
     regions_to_use = single_region if single_region else bed_regions
@@ -866,22 +1378,25 @@ def main():
         hifi_file=args.hifi,
         ont_file=args.nano,
         target_sequences=target_sequences,
-        regions=regions_to_use
+        regions=regions_to_use,
+        seq_lengths=fai_lengths,
+        cache_dir=args.cache_dir,
+        verbose=args.verbose,
+        gzip_buffer=args.gzip_buffer
     )
 
     # Create plotter with correct parameters
     plotter = DepthPlotter(output_format=args.output_format, max_depth_ratio=args.max_depth_ratio)
     plotter.output_dir = args.output_dir
 
-    print("Starting sequential processing...")
+    print("Collecting regions to plot...")
     successful = 0
     failed = 0
+    tasks = []
 
-    # Process each sequence sequentially
+    # Collect one plotting task per region
     for seq_id, hifi_depths, ont_depths in reader.read_sequences():
         try:
-            print(f"Processing sequence: {seq_id}")
-
             # Determine sequence length from available data
             seq_length = 0
             if len(hifi_depths) > 0:
@@ -900,39 +1415,53 @@ def main():
                 # Plot entire sequence
                 sequence_regions = [(0, seq_length - 1)]
 
-            # Generate images for each region
-            for region_start, region_end in sequence_regions:
-                # Ensure region bounds are valid
-                region_start = max(0, region_start)
-                region_end = min(seq_length - 1, region_end)
-
-                if region_start > region_end:
-                    print(f"Warning: Invalid region [{region_start}, {region_end}] for sequence {seq_id}")
+            # Ensure region bounds are valid, for all regions of the sequence at once
+            bounds = np.array(sequence_regions, dtype=np.int64).reshape(-1, 2)
+            region_starts = np.maximum(bounds[:, 0], 0)
+            region_ends = np.minimum(bounds[:, 1], seq_length - 1)
+            valid = region_starts <= region_ends
+            for region_start, region_end in zip(region_starts[~valid].tolist(), region_ends[~valid].tolist()):
+                print(f"Warning: Invalid region [{region_start}, {region_end}] for sequence {seq_id}")
+
+            for region_start, region_end in zip(region_starts[valid].tolist(), region_ends[valid].tolist()):
+                # Zero-copy views; a missing dataset is an empty array and slices to empty
+                region_hifi = hifi_depths[region_start:region_end+1]
+                region_ont = ont_depths[region_start:region_end+1]
+
+                # An all-zero region (e.g. an unmapped contig) has nothing to draw
+                if not region_hifi.any() and not region_ont.any():
+                    print(f"Warning: No coverage in region [{region_start}, {region_end}] for sequence {seq_id}, skipping")
+                    failed += 1
                     continue
 
-                # Extract region data safely
-                region_hifi = hifi_depths[region_start:region_end+1] if len(hifi_depths) > 0 else []
-                region_ont = ont_depths[region_start:region_end+1] if len(ont_depths) > 0 else []
-
-                result = plotter.plot_single_sequence(
+                tasks.append(dict(
                     seq_id=seq_id,
                     hifi_depths=region_hifi,
                     ont_depths=region_ont,
                     window_size=args.window_size,
                     regions=[(region_start, region_end)],
                     output_dir=args.output_dir
-                )
-
-                if result:
-                    successful += 1
-                    print(f"  Generated: {result}")
-                else:
-                    failed += 1
+                ))
 
         except Exception as e:
             print(f"Error processing sequence {seq_id}: {e}")
             failed += 1
 
+    # Generate images, in parallel when more than one worker is requested
+    workers = max(1, min(args.threads, len(tasks)))
+    print(f"Plotting {len(tasks)} regions using {workers} worker(s)...")
+    progress_step = max(1, len(tasks) // 100)
+    for done, (_, result) in enumerate(plotter.iter_plots(tasks, max_workers=workers), 1):
+        if result:
+            successful += 1
+            if args.verbose:
+                print(f"  Generated: {result}")
+        else:
+            failed += 1
+        if not args.verbose and (done % progress_step == 0 or done == len(tasks)):
+            print(f"  Plotted {done}/{len(tasks)} regions")
+    plotter.close()
+
     print(f"\nProcessing completed!")
     print(f"Successful: {successful}, Failed: {failed}")
 
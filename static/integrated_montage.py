@@ -24,27 +24,81 @@ import argparse
 import os
 import re
 import math
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import groupby
 from typing import Dict, List, Tuple
 
-# Import local modules
-from depth_plotter import FAIParser, SynchronizedDepthReader, SlidingWindowProcessor, DataProcessor
-import LINKVIEW as LV
+# numpy, depth_plotter (matplotlib/pandas) and LINKVIEW (cairosvg) are imported inside
+# run() so that --help and argument errors return without loading them
+
+# Precompiled patterns for parsing LINKVIEW's SVG output
+_RE_SVG_W = re.compile(r'<svg[^>]*\bwidth="(\d+)"')
+_RE_SVG_H = re.compile(r'<svg[^>]*\bheight="(\d+)"')
+_RE_CHRO_RECT = re.compile(r'<rect[^>]*class="chro"[^>]*>')
+_RE_SCALE_BBOX = re.compile(r'<rect[^>]*class="scale-bbox"[^>]*>')
+_RE_ATTR_ANY = re.compile(r'\b(x|y|width|height)="([\d\.]+)"')
+_RE_WS = re.compile(r'\s+')
+_RE_ATTR_VALUE = re.compile(rb'="[^"]*"')
+_RE_LONG_FLOAT = re.compile(rb'-?\d+\.\d{3,}')
+
+# SVG element templates for the depth panels (%-formatting is cheaper than f-strings per element)
+_BAR_TOP_FMT = '<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" class="depth-top"/>'
+# Templates whose %s fields are constant per panel/axis are filled once with pre-formatted
+# _f2() strings, leaving only the per-element %%.2f fields
+_BAR_BOT_FMT = '<rect x="%%.2f" y="%s" width="%%.2f" height="%%.2f" class="depth-bottom"/>'
+_BG_FMT = '<rect x="%%.2f" y="%s" width="%%.2f" height="%s" class="%s"/>'
+_MEAN_FMT = '<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f" class="mean"/>'
+_TICK_FMT = '<line x1="%%.2f" y1="%s" x2="%%.2f" y2="%s" class="axis-tick"/>'
+_TICK_LABEL_FMT = '<text x="%%.2f" y="%s" class="axis-label" font-size="%s">%%d</text>'
+# LINKVIEW's scale-bbox spans 20px above to 5px below the scale line at svg_height * scale_y_ratio
+_SCALE_BBOX_ABOVE = 20.0
+_SCALE_BBOX_BELOW = 5.0
+
+
+@lru_cache(maxsize=4096)
+def _f2(v: float) -> str:
+    """'%.2f' formatting, cached for the few coordinates repeated across many elements"""
+    return '%.2f' % v
+
+
+def _shrink_svg(svg_bytes: bytes) -> bytes:
+    """Round coordinates inside attribute values to 2 decimals.
+    LINKVIEW writes full float reprs (e.g. 1216.5476500227956); 2 decimals is far below a
+    pixel and shrinks the output considerably. Text content (labels) is left untouched.
+    """
+    return _RE_ATTR_VALUE.sub(lambda m: _RE_LONG_FLOAT.sub(_round_float, m.group(0)), svg_bytes)
+
 
+def _round_float(m) -> bytes:
+    return b'%.2f' % float(m.group(0))
 
-def _read_file(path: str) -> str:
-    with open(path, 'r', encoding='utf-8') as f:
-        return f.read()
+
+def _rect_attrs(tag: str) -> Tuple[float, float, float, float]:
+    """Return (x, y, width, height) of a <rect> tag in one scan (missing attributes are 0.0)"""
+    vals = {}
+    for mm in _RE_ATTR_ANY.finditer(tag):
+        # Keep the first occurrence of each attribute
+        vals.setdefault(mm.group(1), mm.group(2))
+    return (float(vals.get('x', 0.0)), float(vals.get('y', 0.0)),
+            float(vals.get('width', 0.0)), float(vals.get('height', 0.0)))
 
 
 def _extract_inner_svg(svg_text: str) -> Tuple[str, int, int]:
     """Extract the inner contents of the LINKVIEW-generated SVG and its width/height."""
-    m_w = re.search(r'<svg[^>]*\bwidth="(\d+)"', svg_text)
-    m_h = re.search(r'<svg[^>]*\bheight="(\d+)"', svg_text)
+    m_w = _RE_SVG_W.search(svg_text)
+    m_h = _RE_SVG_H.search(svg_text)
     width = int(m_w.group(1)) if m_w else 1200
     height = int(m_h.group(1)) if m_h else 800
     # 去除最外层 <svg> 包裹，保留内部节点
-    inner = re.sub(r'^<svg[^>]*>', '', svg_text)
-    inner = re.sub(r'</svg>\s*$', '', inner)
+    inner = svg_text
+    if inner.startswith('<svg'):
+        inner = inner[inner.find('>') + 1:]
+    close = inner.rfind('</svg>')
+    if close >= 0 and not inner[close + 6:].strip():
+        inner = inner[:close]
     return inner, width, height
 
 
@@ -52,93 +106,155 @@ def _collect_chro_tracks(inner_svg: str) -> List[Tuple[float, float, float, floa
     """Collect chromosome track rectangles (x/y/width/height) from LINKVIEW's inner SVG.
     Return a list sorted by y ascending: tuples of (x_left, y_top, width, height).
     """
-    rects = []
-    for m in re.finditer(r'<rect[^>]*class="chro"[^>]*>', inner_svg):
-        tag = m.group(0)
-        def _attr(name, default=0.0):
-            mm = re.search(rf'\b{name}="([\d\.]+)"', tag)
-            return float(mm.group(1)) if mm else default
-        x = _attr('x')
-        y = _attr('y')
-        w = _attr('width')
-        h = _attr('height', 0.0)
-        rects.append((x, y, w, h))
+    rects = [_rect_attrs(m.group(0)) for m in _RE_CHRO_RECT.finditer(inner_svg)]
     # Cluster by y (same row), take each row's min x and max right edge
-    if not rects:
-        return []
     rects.sort(key=lambda t: t[1])
     tracks = []
-    current_y = None
-    x_left = None
-    x_right = None
-    h_max = 0.0
-    for x, y, w, h in rects:
-        if current_y is None:
-            current_y = y
-            x_left = x
-            x_right = x + w
-            h_max = max(h_max, h)
-            continue
-        if abs(y - current_y) < 1e-6:
-            x_left = min(x_left, x)
-            x_right = max(x_right, x + w)
-            h_max = max(h_max, h)
-        else:
-            tracks.append((x_left, current_y, x_right - x_left, h_max if h_max > 0 else 15.0))
-            current_y = y
-            x_left = x
-            x_right = x + w
-            h_max = h
-    tracks.append((x_left, current_y, x_right - x_left, h_max if h_max > 0 else 15.0))
+    for _, row in groupby(rects, key=lambda t: round(t[1], 6)):
+        row = list(row)
+        x_left = min(t[0] for t in row)
+        x_right = max(t[0] + t[2] for t in row)
+        h_max = max(t[3] for t in row)
+        tracks.append((x_left, row[0][1], x_right - x_left, h_max if h_max > 0 else 15.0))
     return tracks
 
 def _extract_scale_bbox(inner_svg: str) -> Tuple[float, float, float, float]:
     """Parse the scale bar bounding box (scale-bbox) inside LINKVIEW SVG.
     Return (x, y, w, h); return None if not present.
     """
-    m = re.search(r'<rect[^>]*class="scale-bbox"[^>]*>', inner_svg)
+    m = _RE_SCALE_BBOX.search(inner_svg)
     if not m:
         return None
-    tag = m.group(0)
-    def _attr(name, default=0.0):
-        mm = re.search(rf'\b{name}="([\d\.]+)"', tag)
-        return float(mm.group(1)) if mm else default
-    return (_attr('x'), _attr('y'), _attr('width'), _attr('height'))
-
-
-def _build_depth_polygon(xs: List[float], ys: List[float], baseline_y: float, fill_down: bool) -> str:
-    """Build path data for filled curves, supporting upward/downward fill."""
-    if not xs:
-        return ''
-    pts = []
-    if fill_down:
-        # Curve from left to right, then return to right baseline, close to left baseline
-        pts.append(f'M {xs[0]:.2f} {baseline_y:.2f}')
-        for x, y in zip(xs, ys):
-            pts.append(f'L {x:.2f} {y:.2f}')
-        pts.append(f'L {xs[-1]:.2f} {baseline_y:.2f}')
-        pts.append(f'L {xs[0]:.2f} {baseline_y:.2f}')
-    else:
-        # Upward fill: go along the curve, return to right baseline, close
-        pts.append(f'M {xs[0]:.2f} {ys[0]:.2f}')
-        for x, y in zip(xs[1:], ys[1:]):
-            pts.append(f'L {x:.2f} {y:.2f}')
-        pts.append(f'L {xs[-1]:.2f} {baseline_y:.2f}')
-        pts.append(f'L {xs[0]:.2f} {baseline_y:.2f}')
-    pts.append('Z')
-    return ' '.join(pts)
-
-
-def _scale_x_by_length(indexes: List[int], total_length: int, x_left: float, x_right: float) -> List[float]:
-    """将索引按总长度线性映射到 [x_left, x_right]，确保首尾精确对齐。
-    当 total_length==1 时，调用方应特殊处理（绘制到两端）。
+    return _rect_attrs(m.group(0))
+
+def _overlaps(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2) -> bool:
+    return not (ax2 <= bx1 or bx2 <= ax1 or ay2 <= by1 or by2 <= ay1)
+
+def _solve_scale_ratio(depth_rects, svg_height: float, sb_abs, middle_y: float, candidates: List[float]):
+    """Pick a scale_y_ratio whose scale bar bbox misses every depth rect, or None.
+    LINKVIEW draws the bbox from `_SCALE_BBOX_ABOVE` px above to `_SCALE_BBOX_BELOW` px below
+    svg_height * ratio, so the bbox (same x range as the rendered `sb_abs`) can be predicted
+    per ratio. Candidates are tried in order; failing those, the clear position nearest the
+    first candidate is solved from the depth rects' y intervals.
     """
-    if not indexes:
+    bx1, _, bx2, _ = sb_abs
+    def _clear(y):
+        return not any(_overlaps(bx1, y - _SCALE_BBOX_ABOVE + middle_y, bx2, y + _SCALE_BBOX_BELOW + middle_y, *rect)
+                       for rect in depth_rects)
+    for ratio in candidates:
+        ratio = max(0.0, min(1.0, ratio))
+        if _clear(svg_height * ratio):
+            return ratio
+    # Touching a panel edge is allowed, so the bbox can sit flush above or below each panel
+    edges = [0.0, float(svg_height)]
+    for _, ry1, _, ry2 in depth_rects:
+        edges.append(ry1 - middle_y - _SCALE_BBOX_BELOW)
+        edges.append(ry2 - middle_y + _SCALE_BBOX_ABOVE)
+    preferred = svg_height * max(0.0, min(1.0, candidates[0])) if candidates else 0.0
+    clear = [y for y in edges if 0.0 <= y <= svg_height and _clear(y)]
+    if not clear:
+        return None
+    return min(clear, key=lambda y: abs(y - preferred)) / svg_height
+
+def _predict_chro_tracks(args: argparse.Namespace) -> List[Tuple[float, float, float, float]]:
+    """Predict LINKVIEW's chromosome track rows from the karyotype file before rendering.
+    Mirrors LINKVIEW's vertical layout (one row per non-comment karyotype line, spaced
+    svg_height / (rows + 1) apart). Only y/height are meaningful; return [] without a karyotype.
+    """
+    if not args.karyotype or not os.path.exists(args.karyotype):
         return []
-    if total_length <= 1:
-        return [x_left for _ in indexes]
-    span = x_right - x_left
-    return [x_left + (i / (total_length - 1)) * span for i in indexes]
+    with open(args.karyotype, 'r', encoding='utf-8') as f:
+        rows = [line.strip() for line in f if not line.startswith('#')]
+    space_vertical = args.svg_height / (len(rows) + 1)
+    tracks = []
+    top = 0
+    for row in rows:
+        top += space_vertical
+        if row:
+            tracks.append((0.0, float(top), 0.0, float(args.chro_thickness) or 15.0))
+    return tracks
+
+@dataclass
+class Layout:
+    """Depth panel placement around LINKVIEW's top/bottom chromosome tracks.
+    All y values are in final-canvas coordinates (already shifted by global_offset).
+    """
+    x_left_top: float
+    x_right_top: float
+    x_left_bottom: float
+    x_right_bottom: float
+    y_top: float
+    h_top: float
+    y_bottom: float
+    h_bottom: float
+    depth_height: float
+    panel_gap: float
+    block_y_top: float
+    block_y_bottom: float
+    global_offset: float
+
+    @property
+    def middle_y(self) -> float:
+        """Vertical translation applied to the LINKVIEW contents"""
+        return self.global_offset
+
+    @property
+    def depth_rects(self) -> List[Tuple[float, float, float, float]]:
+        """(x1, y1, x2, y2) of the top and bottom combined depth panels"""
+        return [
+            (self.x_left_top, self.block_y_top, self.x_right_top, self.block_y_top + 2 * self.depth_height),
+            (self.x_left_bottom, self.block_y_bottom, self.x_right_bottom, self.block_y_bottom + 2 * self.depth_height),
+        ]
+
+
+def _compute_layout(tracks: List[Tuple[float, float, float, float]], args: argparse.Namespace) -> Layout:
+    """Row-anchored layout: top depth panels above the top track, bottom panels below the bottom track.
+    If only one track exists, both panels use it.
+    """
+    top_track = tracks[0]
+    bottom_track = tracks[1] if len(tracks) > 1 else tracks[0]
+    x_left_top, y_top, w_top, h_top = top_track
+    x_left_bottom, y_bottom, w_bottom, h_bottom = bottom_track
+    depth_height = args.depth_height
+    # Panel gap defaults to 10% of depth panel height
+    panel_gap = args.panel_gap if args.panel_gap is not None else max(1, int(round(depth_height * 0.1)))
+    block_y_top = y_top - panel_gap - (2 * depth_height)
+    block_y_bottom = y_bottom + h_bottom + panel_gap
+    global_offset = 0.0
+    # If the top combined panel would be negative, shift everything down to 0
+    if block_y_top < 0:
+        global_offset = -block_y_top
+        block_y_top += global_offset
+        block_y_bottom += global_offset
+        y_top += global_offset
+        y_bottom += global_offset
+    # Force an explicit top margin padding for the entire composition
+    top_margin = max(0, int(vars(args).get('top_margin', 0)))
+    if top_margin > 0:
+        block_y_top += top_margin
+        block_y_bottom += top_margin
+        y_top += top_margin
+        y_bottom += top_margin
+        global_offset += top_margin
+    return Layout(x_left_top, x_left_top + w_top, x_left_bottom, x_left_bottom + w_bottom,
+                  y_top, h_top, y_bottom, h_bottom, depth_height, panel_gap,
+                  block_y_top, block_y_bottom, global_offset)
+
+
+def _compute_safe_scale_ratio(args: argparse.Namespace, layout: Layout):
+    """Return a scale_y_ratio that keeps the scale bar out of the depth panels of `layout`,
+    or None if the requested args.scale_y_ratio does not hit a panel.
+    """
+    depth_height = layout.depth_height
+    default_abs_y = layout.middle_y + args.svg_height * float(vars(args).get('scale_y_ratio', 0.9))
+    if not ((layout.block_y_top <= default_abs_y <= (layout.block_y_top + 2 * depth_height)) or (layout.block_y_bottom <= default_abs_y <= (layout.block_y_bottom + 2 * depth_height))):
+        return None
+    # Choose a safe vertical position in the lower half of the gap between tracks,
+    # prioritizing bottom-right placement
+    gap = max(0.0, layout.y_bottom - (layout.y_top + layout.h_top))
+    # Select ~75% into the lower half and leave 10px margin to avoid touching bottom
+    safe_y = min(layout.y_bottom - 10.0, layout.y_top + layout.h_top + gap * 0.75)
+    return max(0.0, min(1.0, safe_y / args.svg_height))
 
 
 def _scale_y(depths: List[float], mean_depth: float, panel_top: float, panel_height: float, max_ratio: float, up: bool) -> List[float]:
@@ -157,6 +273,18 @@ def _scale_y(depths: List[float], mean_depth: float, panel_top: float, panel_hei
 
 
 def run(args: argparse.Namespace):
+    import numpy as np
+    from depth_plotter import FAIParser, SynchronizedDepthReader, SlidingWindowProcessor, DataProcessor, _GZIP_BLOCK_SIZE
+    import LINKVIEW as LV
+    # Optional settings (absent when run() gets a hand-built Namespace), looked up once
+    opts = vars(args)
+    top_margin = max(0, int(opts.get('top_margin', 0)))
+    scale_y_ratio = opts.get('scale_y_ratio', 0.9)
+    debug_margin = opts.get('debug_margin', False)
+    tick_n = max(2, int(opts.get('depth_axis_ticks', 5)))
+    font_size = opts.get('depth_axis_font_size', 12)
+    # None (the CLI default) means depth_plotter's default block size
+    gzip_buffer = opts.get('gzip_buffer') or _GZIP_BLOCK_SIZE
     # 1) Call LINKVIEW to generate the middle alignment layout (SVG only),
     #    and save to a temporary file prefix
     tmp_prefix = args.output + '.__linkview_tmp'
@@ -178,7 +306,7 @@ def run(args: argparse.Namespace):
         'chro_axis_density': args.chro_axis_density,
         'show_pos_with_label': args.show_pos_with_label,
         'scale': args.scale,
-        'scale_y_ratio': getattr(args, 'scale_y_ratio', 0.9),
+        'scale_y_ratio': scale_y_ratio,
         'no_scale': args.no_scale,
         'output': tmp_prefix,
         'min_identity': args.min_identity,
@@ -197,111 +325,68 @@ def run(args: argparse.Namespace):
     # LINKVIEW uses label_angle = 360 - angle; keep consistent here
     if lv_args.label_angle:
         lv_args.label_angle = 360 - float(lv_args.label_angle)
-    LV.main(lv_args)
+    # Place the scale bar clear of the depth panels up front when the karyotype lets us
+    # predict the track rows; the overlap checks below only re-render on a misprediction
+    predicted_tracks = _predict_chro_tracks(args)
+    if predicted_tracks:
+        predicted_ratio = _compute_safe_scale_ratio(args, _compute_layout(predicted_tracks, args))
+        if predicted_ratio is not None:
+            lv_args.scale_y_ratio = predicted_ratio
+    # LINKVIEW returns the SVG text it writes, so retries never read the temp file back
     tmp_svg_path = tmp_prefix + '.svg'
-    inner, width, align_height = _extract_inner_svg(_read_file(tmp_svg_path))
+    inner, width, align_height = _extract_inner_svg(LV.main(lv_args))
     tracks = _collect_chro_tracks(inner)
     if not tracks:
         raise RuntimeError('Failed to identify chromosome tracks in LINKVIEW SVG.')
 
-    # Compute depth panel layout positions, used to test overlap with scale bar bbox
-    top_track = tracks[0]
-    bottom_track = tracks[1] if len(tracks) > 1 else tracks[0]
-    x_left_top, y_top, w_top, h_top = top_track
-    x_left_bottom, y_bottom, w_bottom, h_bottom = bottom_track
-    x_right_top = x_left_top + w_top
-    x_right_bottom = x_left_bottom + w_bottom
-    depth_height = args.depth_height
-    panel_gap = args.panel_gap if args.panel_gap is not None else max(1, int(round(depth_height * 0.1)))
-    block_y_top = y_top - panel_gap - (2 * depth_height)
-    block_y_bottom = y_bottom + h_bottom + panel_gap
-    global_offset = 0.0
-    # If the top combined panel would be negative, shift down to 0
-    if block_y_top < 0:
-        global_offset = -block_y_top
-        block_y_top += global_offset
-        block_y_bottom += global_offset
-        y_top += global_offset
-        y_bottom += global_offset
-    # Force an explicit top margin padding for the entire composition
-    top_margin = max(0, int(getattr(args, 'top_margin', 0)))
-    if top_margin > 0:
-        block_y_top += top_margin
-        block_y_bottom += top_margin
-        y_top += top_margin
-        y_bottom += top_margin
-        global_offset += top_margin
-    middle_y = global_offset
+    # Compute depth panel layout positions once; used for the scale bar overlap test and drawing
+    layout = _compute_layout(tracks, args)
+    depth_height = layout.depth_height
+    panel_gap = layout.panel_gap
+    middle_y = layout.middle_y
 
     # Parse the scale bar bbox and test if it overlaps with top/bottom depth panels.
-    # If overlapping, try other candidate positions and regenerate LINKVIEW.
-    def _overlaps(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
-        return not (ax2 <= bx1 or bx2 <= ax1 or ay2 <= by1 or by2 <= ay1)
+    # If overlapping, solve for a clear position and regenerate LINKVIEW once.
     def _scale_bbox_abs(inner_svg_text: str):
         bbox = _extract_scale_bbox(inner_svg_text)
         if not bbox:
             return None
         sx, sy, sw, sh = bbox
         return (sx, sy + middle_y, sx + sw, sy + sh + middle_y)
-    def _depth_rects():
-        return [
-            (x_left_top, block_y_top, x_right_top, block_y_top + 2 * depth_height),
-            (x_left_bottom, block_y_bottom, x_right_bottom, block_y_bottom + 2 * depth_height),
-        ]
+    def _hits_depth(sb_abs) -> bool:
+        return any(_overlaps(*sb_abs, *rect) for rect in depth_rects)
+    depth_rects = layout.depth_rects
 
     # First, quick check whether the default bottom-right position overlaps depth panels
-    default_ratio = getattr(lv_args, 'scale_y_ratio', 0.9)
-    default_abs_y = middle_y + args.svg_height * float(default_ratio)
-    depth_rects = _depth_rects()
-    default_hits_depth = (block_y_top <= default_abs_y <= (block_y_top + 2 * depth_height)) or (block_y_bottom <= default_abs_y <= (block_y_bottom + 2 * depth_height))
-    if default_hits_depth:
-        # Choose a safe vertical position in the lower half of the gap between tracks,
-        # prioritizing bottom-right placement
-        gap = max(0.0, y_bottom - (y_top + h_top))
-        # Select ~75% into the lower half and leave 10px margin to avoid touching bottom
-        safe_y = min(y_bottom - 10.0, y_top + h_top + gap * 0.75)
-        safe_ratio = max(0.0, min(1.0, safe_y / args.svg_height))
-        lv_args.scale_y_ratio = safe_ratio
-        LV.main(lv_args)
-        inner_new, width_new, align_height_new = _extract_inner_svg(_read_file(tmp_svg_path))
-        # If it still overlaps depth panels, try other candidate vertical ratios
-        sb_abs_try = _scale_bbox_abs(inner_new)
-        if sb_abs_try is not None:
-            hit_depth = any(_overlaps(sb_abs_try[0], sb_abs_try[1], sb_abs_try[2], sb_abs_try[3], rx1, ry1, rx2, ry2) for rx1, ry1, rx2, ry2 in depth_rects)
-            if hit_depth:
-                for ratio in [max(0.0, min(1.0, (y_top + h_top + gap * 0.6) / args.svg_height)),
-                              max(0.0, min(1.0, (y_top + h_top + gap * 0.3) / args.svg_height)),
-                              0.95]:
-                    lv_args.scale_y_ratio = ratio
-                    LV.main(lv_args)
-                    inner_new2, width_new2, align_height_new2 = _extract_inner_svg(_read_file(tmp_svg_path))
-                    sb_abs_new2 = _scale_bbox_abs(inner_new2)
-                    if sb_abs_new2 is None:
-                        inner_new = inner_new2; align_height_new = align_height_new2; width_new = width_new2
-                        break
-                    hit2 = any(_overlaps(sb_abs_new2[0], sb_abs_new2[1], sb_abs_new2[2], sb_abs_new2[3], rx1, ry1, rx2, ry2) for rx1, ry1, rx2, ry2 in depth_rects)
-                    if not hit2:
-                        inner_new = inner_new2; align_height_new = align_height_new2; width_new = width_new2
-                        break
-        inner = inner_new; align_height = align_height_new; width = width_new
+    default_ratio = scale_y_ratio
+    safe_ratio = _compute_safe_scale_ratio(args, layout)
+    if safe_ratio is not None:
+        if lv_args.scale_y_ratio != safe_ratio:
+            lv_args.scale_y_ratio = safe_ratio
+            inner, width, align_height = _extract_inner_svg(LV.main(lv_args))
+        # Preferred fallbacks: higher up in the gap between tracks, then the very bottom
+        gap = max(0.0, layout.y_bottom - (layout.y_top + layout.h_top))
+        fallback_ratios = [max(0.0, min(1.0, (layout.y_top + layout.h_top + gap * 0.6) / args.svg_height)),
+                           max(0.0, min(1.0, (layout.y_top + layout.h_top + gap * 0.3) / args.svg_height)),
+                           0.95]
     else:
-        # If default does not overlap but parsed bbox overlaps, try candidate positions
-        sb_abs = _scale_bbox_abs(inner)
-        if sb_abs is not None:
-            need_relocate = any(_overlaps(sb_abs[0], sb_abs[1], sb_abs[2], sb_abs[3], rx1, ry1, rx2, ry2) for rx1, ry1, rx2, ry2 in depth_rects)
-            if need_relocate:
-                for ratio in [0.42, 0.12, 0.95]:
-                    lv_args.scale_y_ratio = ratio
-                    LV.main(lv_args)
-                    inner_new, width_new, align_height_new = _extract_inner_svg(_read_file(tmp_svg_path))
-                    sb_abs_new = _scale_bbox_abs(inner_new)
-                    if sb_abs_new is None:
-                        inner = inner_new; align_height = align_height_new; width = width_new
-                        break
-                    hit = any(_overlaps(sb_abs_new[0], sb_abs_new[1], sb_abs_new[2], sb_abs_new[3], rx1, ry1, rx2, ry2) for rx1, ry1, rx2, ry2 in depth_rects)
-                    if not hit:
-                        inner = inner_new; align_height = align_height_new; width = width_new
-                        break
+        if lv_args.scale_y_ratio != default_ratio:
+            # The predicted layout relocated the scale bar needlessly; render at the default
+            lv_args.scale_y_ratio = default_ratio
+            inner, width, align_height = _extract_inner_svg(LV.main(lv_args))
+        fallback_ratios = [0.42, 0.12, 0.95]
+    # If the rendered bbox still overlaps depth panels, predict where the bbox lands for each
+    # fallback ratio instead of rendering them all in turn
+    sb_abs = _scale_bbox_abs(inner)
+    if sb_abs is not None and _hits_depth(sb_abs):
+        ratio = _solve_scale_ratio(depth_rects, args.svg_height, sb_abs, middle_y, fallback_ratios)
+        if ratio is not None:
+            lv_args.scale_y_ratio = ratio
+            inner_new, width_new, align_height_new = _extract_inner_svg(LV.main(lv_args))
+            # LINKVIEW may still move the bar away from alignments; keep the first render then
+            sb_abs_new = _scale_bbox_abs(inner_new)
+            if sb_abs_new is None or not _hits_depth(sb_abs_new):
+                inner = inner_new; align_height = align_height_new; width = width_new
 
     # 2) Read depth for two chromosomes and compute windowed means
     fai_parser = FAIParser(args.fai)
@@ -317,7 +402,7 @@ def run(args: argparse.Namespace):
                 line = line.strip()
                 if not line or line.startswith('#'):
                     continue
-                token = re.split(r'\s+', line)[0]
+                token = _RE_WS.split(line)[0]
                 parts = token.split(':')
                 base = parts[0]
                 target_chrs.append(base)
@@ -337,23 +422,26 @@ def run(args: argparse.Namespace):
     # Support specifying hifi/ont depth files per chromosome to avoid re-parsing
     chr1 = target_chrs[0] if target_chrs else None
     chr2 = target_chrs[1] if len(target_chrs) > 1 else chr1
-    hifi_a = getattr(args, 'hifi_a', None) or args.hifi
-    nano_a = getattr(args, 'nano_a', None) or args.nano
-    hifi_b = getattr(args, 'hifi_b', None) or args.hifi
-    nano_b = getattr(args, 'nano_b', None) or args.nano
-
-    depth_by_chr: Dict[str, Tuple[List[int], List[int]]] = {}
-    def _read_one(seq_id: str, hf: str, nf: str):
-        if not seq_id:
-            return
+    hifi_a = opts.get('hifi_a') or args.hifi
+    nano_a = opts.get('nano_a') or args.nano
+    hifi_b = opts.get('hifi_b') or args.hifi
+    nano_b = opts.get('nano_b') or args.nano
+
+    def _read_one(seq_ids: set, hf: str, nf: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        found = {}
+        if not seq_ids:
+            return found
         reader = SynchronizedDepthReader(
             hifi_file=hf,
             ont_file=nf,
-            target_sequences={seq_id},
+            target_sequences=seq_ids,
             regions=None,
+            seq_lengths=fai_lengths,
+            cache_dir=opts.get('cache_dir'),
+            gzip_buffer=gzip_buffer,
         )
         for sid, hifi_depths, ont_depths in reader.read_sequences():
-            if sid != seq_id:
+            if sid not in seq_ids:
                 continue
             # If karyotype specifies a range, slice the arrays accordingly
             if sid in karyotype_regions:
@@ -365,33 +453,50 @@ def run(args: argparse.Namespace):
                     hifi_depths = hifi_depths[s:e+1]
                 if len(ont_depths) > 0:
                     ont_depths = ont_depths[s:e+1]
-            depth_by_chr[sid] = (hifi_depths.tolist() if hasattr(hifi_depths, 'tolist') else hifi_depths,
-                                  ont_depths.tolist() if hasattr(ont_depths, 'tolist') else ont_depths)
-    _read_one(chr1, hifi_a, nano_a)
-    _read_one(chr2, hifi_b, nano_b)
-
-    # 3) Coordinate mapping: use per-track x range (top/bottom)
-    #    If only one track exists, use the same range for top and bottom
-    top_track = tracks[0]
-    bottom_track = tracks[1] if len(tracks) > 1 else tracks[0]
-    x_left_top, y_top, w_top, h_top = top_track
-    x_left_bottom, y_bottom, w_bottom, h_bottom = bottom_track
-    x_right_top = x_left_top + w_top
-    x_right_bottom = x_left_bottom + w_bottom
+            # Keep the reader's ndarrays; Python int lists cost ~28 bytes per base
+            found[sid] = (hifi_depths, ont_depths)
+        return found
+    if hifi_a == hifi_b and nano_a == nano_b:
+        # One depth file pair covers both chromosomes: decode it once for both
+        jobs = [({c for c in (chr1, chr2) if c}, hifi_a, nano_a)]
+    else:
+        jobs = [({chr1} if chr1 else set(), hifi_a, nano_a), ({chr2} if chr2 else set(), hifi_b, nano_b)]
+    # Separate reads are dominated by gzip decoding (which releases the GIL), so overlap them
+    depth_by_chr: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        for found in executor.map(lambda a: _read_one(*a), jobs):
+            depth_by_chr.update(found)
 
     # 4) Depth window bars (strictly follow depth_plotter_v2 window stats and split logic)
     sw = SlidingWindowProcessor(window_size=args.window_size)
-    # Panel gap defaults to 10% of depth panel height
-    depth_height = args.depth_height
-    panel_gap = args.panel_gap if args.panel_gap is not None else max(1, int(round(depth_height * 0.1)))
     max_ratio = args.max_depth_ratio
 
+    def _bar_geometry(means, starts, ends, cap, global_cap, x_left, span, seq_len):
+        """Vectorized bar x, width and height (pixels) for windowed means"""
+        denom = max(1, seq_len - 1)
+        x_center = x_left + (((starts + ends) / 2.0) / denom) * span
+        w_px = span * ((ends - starts + 1) / denom)
+        h_px = depth_height * (np.minimum(means, cap) / global_cap)
+        return x_center - w_px / 2.0, w_px, h_px
+
+    def _bg_rects(region_list, cls, y, x_left, span, seq_len):
+        """Background rects for (start, end) regions; zero-width regions are dropped"""
+        bounds = np.array(region_list, dtype=np.int64).reshape(-1, 2)
+        denom = max(1, seq_len - 1)
+        x1 = x_left + (bounds[:, 0] / denom) * span
+        x2 = x_left + (bounds[:, 1] / denom) * span
+        w_px_bg = x2 - x1
+        keep = w_px_bg > 0
+        row_fmt = _BG_FMT % (_f2(y), _f2(depth_height), cls)
+        return [row_fmt % (x, w)
+                for x, w in zip(x1[keep].tolist(), w_px_bg[keep].tolist())]
+
     def build_bars_for_seq(hifi_arr, ont_arr, x_left: float, x_right: float, panel_origin_y: float) -> Tuple[List[str], List[str], List[str], float]:
-        # Input can be list or numpy; convert to list
-        h = hifi_arr if hifi_arr is not None else []
-        n = ont_arr if ont_arr is not None else []
-        seq_len = max(len(h) if hasattr(h, '__len__') else 0,
-                      len(n) if hasattr(n, '__len__') else 0)
+        h = hifi_arr
+        n = ont_arr
+        h_size = 0 if h is None else h.size
+        n_size = 0 if n is None else n.size
+        seq_len = max(h_size, n_size)
         if seq_len == 0:
             return [], [], [], panel_origin_y + depth_height
         # Compute window statistics (reuse DataProcessor)
@@ -399,11 +504,13 @@ def run(args: argparse.Namespace):
         bg_elems = []
         bars_top = []
         bars_bottom = []
-        # Compute per-dataset average depths (excluding zeros) and a unified cap for scaling
-        nz_h = [v for v in h if v > 0]
-        nz_n = [v for v in n if v > 0]
-        avg_h_nonzero = (sum(nz_h) / len(nz_h)) if len(nz_h) > 0 else 0.0
-        avg_n_nonzero = (sum(nz_n) / len(nz_n)) if len(nz_n) > 0 else 0.0
+        # One fused pass per dataset: window sums, zero/low regions and the non-zero mean
+        # all share a single non-zero mask
+        stats_h = DataProcessor('hifi', color='#2ca25f', window_size=args.window_size).process(np.asarray(h), args.min_safe_depth) if h_size > 0 else None
+        stats_n = DataProcessor('ont', color='#3C5488', window_size=args.window_size).process(np.asarray(n), args.min_safe_depth) if n_size > 0 else None
+        # Per-dataset average depths (excluding zeros) and a unified cap for scaling
+        avg_h_nonzero = stats_h['nonzero_avg'] if stats_h else 0.0
+        avg_n_nonzero = stats_n['nonzero_avg'] if stats_n else 0.0
         cap_h = (avg_h_nonzero * max_ratio) if avg_h_nonzero > 0 else 0.0
         cap_n = (avg_n_nonzero * max_ratio) if avg_n_nonzero > 0 else 0.0
         # Use a shared cap for both halves so their heights are comparable
@@ -412,122 +519,71 @@ def run(args: argparse.Namespace):
             global_cap = 1.0
         baseline_y = panel_origin_y + depth_height
 
-        if len(h) > 0:
-            dp_h = DataProcessor('hifi', color='#2ca25f', window_size=args.window_size)
-            means_h, starts_h, ends_h = dp_h.calculate_windowed_stats(__import__('numpy').array(h))
-            # Region analysis and background rectangles (upper half)
-            regions_h = dp_h.analyze_depth_regions(__import__('numpy').array(h), args.min_safe_depth)
+        if stats_h:
+            means_h, starts_h, ends_h = stats_h['means'], stats_h['starts'], stats_h['ends']
+            # Background rectangles (upper half)
+            regions_h = stats_h['regions']
             span = x_right - x_left
             for region_type, region_list in regions_h.items():
                 cls = 'depth-zero-bg' if region_type == 'zero' else ('depth-low-bg' if region_type == 'low' else None)
-                if not cls:
-                    continue
-                for s, e in region_list:
-                    x1 = x_left + (s / max(1, seq_len - 1)) * span
-                    x2 = x_left + (e / max(1, seq_len - 1)) * span
-                    w_px_bg = max(0.0, x2 - x1)
-                    if w_px_bg <= 0:
-                        continue
-                    bg_elems.append(f'<rect x="{x1:.2f}" y="{(baseline_y - depth_height):.2f}" width="{w_px_bg:.2f}" height="{depth_height:.2f}" class="{cls}"/>')
+                if cls and region_list:
+                    bg_elems.extend(_bg_rects(region_list, cls, baseline_y - depth_height, x_left, span, seq_len))
             # Generate upper-half bars (HiFi)
-            for m, s, e in zip(means_h.tolist(), starts_h.tolist(), ends_h.tolist()):
-                center = (s + e) / 2.0
-                width_bp = (e - s + 1)
-                x_center = x_left + (center / max(1, seq_len - 1)) * span
-                w_px = span * (width_bp / max(1, seq_len - 1))
-                # Clamp bar height to HiFi cap, scale by shared global cap
-                hifi_cap = cap_h if cap_h > 0 else global_cap
-                m_clamped = min(m, hifi_cap)
-                h_px = depth_height * (m_clamped / global_cap)
-                x_rect = x_center - w_px / 2.0
-                y_rect = baseline_y - h_px
-                bars_top.append(f'<rect x="{x_rect:.2f}" y="{y_rect:.2f}" width="{w_px:.2f}" height="{h_px:.2f}" class="depth-top"/>')
+            # Clamp bar height to HiFi cap, scale by shared global cap
+            hifi_cap = cap_h if cap_h > 0 else global_cap
+            x_rect, w_px, h_px = _bar_geometry(means_h, starts_h, ends_h, hifi_cap, global_cap, x_left, span, seq_len)
+            y_rect = baseline_y - h_px
+            bars_top.extend(_BAR_TOP_FMT % t for t in zip(x_rect.tolist(), y_rect.tolist(), w_px.tolist(), h_px.tolist()))
             # Mean line (HiFi)
             avg_h = (sum(means_h.tolist()) / len(means_h)) if len(means_h) > 0 else 0.0
             if avg_h > 0:
                 avg_h_clamped = min(avg_h, hifi_cap)
                 y_mean = baseline_y - depth_height * (avg_h_clamped / global_cap)
-                bars_top.append(f'<line x1="{x_left:.2f}" y1="{y_mean:.2f}" x2="{x_right:.2f}" y2="{y_mean:.2f}" class="mean"/>')
-        if len(n) > 0:
-            dp_n = DataProcessor('ont', color='#3C5488', window_size=args.window_size)
-            means_n, starts_n, ends_n = dp_n.calculate_windowed_stats(__import__('numpy').array(n))
-            # Region analysis and background rectangles (lower half)
-            regions_n = dp_n.analyze_depth_regions(__import__('numpy').array(n), args.min_safe_depth)
+                bars_top.append(_MEAN_FMT % (x_left, y_mean, x_right, y_mean))
+        if stats_n:
+            means_n, starts_n, ends_n = stats_n['means'], stats_n['starts'], stats_n['ends']
+            # Background rectangles (lower half)
+            regions_n = stats_n['regions']
             span = x_right - x_left
             for region_type, region_list in regions_n.items():
                 cls = 'depth-zero-bg' if region_type == 'zero' else ('depth-low-bg' if region_type == 'low' else None)
-                if not cls:
-                    continue
-                for s, e in region_list:
-                    x1 = x_left + (s / max(1, seq_len - 1)) * span
-                    x2 = x_left + (e / max(1, seq_len - 1)) * span
-                    w_px_bg = max(0.0, x2 - x1)
-                    if w_px_bg <= 0:
-                        continue
-                    bg_elems.append(f'<rect x="{x1:.2f}" y="{baseline_y:.2f}" width="{w_px_bg:.2f}" height="{depth_height:.2f}" class="{cls}"/>')
-            for m, s, e in zip(means_n.tolist(), starts_n.tolist(), ends_n.tolist()):
-                center = (s + e) / 2.0
-                width_bp = (e - s + 1)
-                x_center = x_left + (center / max(1, seq_len - 1)) * span
-                w_px = span * (width_bp / max(1, seq_len - 1))
-                # Clamp bar height to ONT cap, scale by shared global cap
-                ont_cap = cap_n if cap_n > 0 else global_cap
-                m_clamped = min(m, ont_cap)
-                h_px = depth_height * (m_clamped / global_cap)
-                x_rect = x_center - w_px / 2.0
-                y_rect = baseline_y
-                bars_bottom.append(f'<rect x="{x_rect:.2f}" y="{y_rect:.2f}" width="{w_px:.2f}" height="{h_px:.2f}" class="depth-bottom"/>')
+                if cls and region_list:
+                    bg_elems.extend(_bg_rects(region_list, cls, baseline_y, x_left, span, seq_len))
+            # Clamp bar height to ONT cap, scale by shared global cap
+            ont_cap = cap_n if cap_n > 0 else global_cap
+            x_rect, w_px, h_px = _bar_geometry(means_n, starts_n, ends_n, ont_cap, global_cap, x_left, span, seq_len)
+            row_fmt = _BAR_BOT_FMT % _f2(baseline_y)
+            bars_bottom.extend(row_fmt % (x, w, hp)
+                               for x, w, hp in zip(x_rect.tolist(), w_px.tolist(), h_px.tolist()))
             avg_n = (sum(means_n.tolist()) / len(means_n)) if len(means_n) > 0 else 0.0
             if avg_n > 0:
                 avg_n_clamped = min(avg_n, ont_cap)
                 y_mean = baseline_y + depth_height * (avg_n_clamped / global_cap)
-                bars_bottom.append(f'<line x1="{x_left:.2f}" y1="{y_mean:.2f}" x2="{x_right:.2f}" y2="{y_mean:.2f}" class="mean"/>')
+                bars_bottom.append(_MEAN_FMT % (x_left, y_mean, x_right, y_mean))
         return bg_elems, bars_top, bars_bottom, baseline_y
 
-    # Row-anchored layout: top depth panels above the top track; bottom depth panels below the bottom track
-    block_y_top = y_top - panel_gap - (2 * depth_height)
-    block_y_bottom = y_bottom + h_bottom + panel_gap
-    # If the top panel would start at a negative y, shift everything down
-    global_offset = 0.0
-    if block_y_top < 0:
-        global_offset = -block_y_top
-        block_y_top += global_offset
-        block_y_bottom += global_offset
-        y_top += global_offset
-        y_bottom += global_offset
-    # Enforce explicit top margin padding for the entire composition
-    top_margin = max(0, int(getattr(args, 'top_margin', 0)))
-    if top_margin > 0:
-        block_y_top += top_margin
-        block_y_bottom += top_margin
-        y_top += top_margin
-        y_bottom += top_margin
-        global_offset += top_margin
-    # Translate alignment contents as a whole to keep track alignment
-    middle_y = global_offset
-
-    hifi1, nano1 = depth_by_chr.get(chr1, ([], []))
-    hifi2, nano2 = depth_by_chr.get(chr2, ([], []))
+    hifi1, nano1 = depth_by_chr.get(chr1, (None, None))
+    hifi2, nano2 = depth_by_chr.get(chr2, (None, None))
 
     # Axis label range (1-based): prefer karyotype ranges, otherwise use depth array length
     def _axis_labels(seq_id: str, h_arr, n_arr):
         if seq_id in karyotype_regions:
             s0, e0 = karyotype_regions[seq_id]
             return (s0 + 1, e0 + 1)
-        L = max(len(h_arr) if hasattr(h_arr, '__len__') else 0,
-                len(n_arr) if hasattr(n_arr, '__len__') else 0)
+        L = max(0 if h_arr is None else h_arr.size,
+                0 if n_arr is None else n_arr.size)
         return (1, L if L > 0 else 1)
     label1_start, label1_end = _axis_labels(chr1, hifi1, nano1)
     label2_start, label2_end = _axis_labels(chr2, hifi2, nano2)
 
     # For each combined panel: draw HiFi bars above and ONT bars below (share same origin)
-    bg_1, bars_top_1, bars_bottom_1, baseline1_y = build_bars_for_seq(hifi1, nano1, x_left_top, x_right_top, block_y_top)
-    bg_2, bars_top_2, bars_bottom_2, baseline2_y = build_bars_for_seq(hifi2, nano2, x_left_bottom, x_right_bottom, block_y_bottom)
+    bg_1, bars_top_1, bars_bottom_1, baseline1_y = build_bars_for_seq(hifi1, nano1, layout.x_left_top, layout.x_right_top, layout.block_y_top)
+    bg_2, bars_top_2, bars_bottom_2, baseline2_y = build_bars_for_seq(hifi2, nano2, layout.x_left_bottom, layout.x_right_bottom, layout.block_y_bottom)
 
     # 5) Assemble final SVG
     # Total height equals max(alignment bottom, bottom combined panel bottom) + bottom margin
     inner_bottom = middle_y + align_height
-    bottom_block_bottom = block_y_bottom + (2 * depth_height)
+    bottom_block_bottom = layout.block_y_bottom + (2 * depth_height)
     total_height = max(inner_bottom, bottom_block_bottom) + panel_gap
     styles = '''<defs><style>
         .depth-top { fill: #2ca25f; opacity: 0.85; }
@@ -546,7 +602,7 @@ def run(args: argparse.Namespace):
     svg_parts = [f'<svg width="{width}" height="{int(total_height)}" xmlns="http://www.w3.org/2000/svg" version="1.1">']
     svg_parts.append(styles)
     # Debug: visualize the enforced top margin if requested
-    if getattr(args, 'debug_margin', False) and top_margin > 0:
+    if debug_margin and top_margin > 0:
         svg_parts.append(f'<rect x="0" y="0" width="{width}" height="{top_margin}" fill="#ffecec" fill-opacity="0.25"/>')
         svg_parts.append(f'<line x1="0" y1="{top_margin}" x2="{width}" y2="{top_margin}" stroke="#ff4d4f" stroke-dasharray="4,4" stroke-width="1"/>')
     # Top combined depth panels (HiFi + ONT)
@@ -555,26 +611,26 @@ def run(args: argparse.Namespace):
     svg_parts.extend(bars_top_1)
     svg_parts.extend(bars_bottom_1)
     # Axis baseline located at the split between the two halves
-    svg_parts.append(f'<line x1="{x_left_top:.2f}" y1="{baseline1_y:.2f}" x2="{x_right_top:.2f}" y2="{baseline1_y:.2f}" class="baseline"/>')
+    svg_parts.append(f'<line x1="{layout.x_left_top:.2f}" y1="{baseline1_y:.2f}" x2="{layout.x_right_top:.2f}" y2="{baseline1_y:.2f}" class="baseline"/>')
     # Axis ticks and labels (top: labels above the axis)
     def _axis_ticks(xl, xr, y, ls, le, above: bool):
+        frac = np.arange(tick_n + 1) / tick_n
+        xs = xl + (xr - xl) * frac
+        vals = np.round(ls + (le - ls) * frac).astype(np.int64)
+        # Tick line
+        tick_h = 6
+        y1 = y - (tick_h if above else 0)
+        y2 = y + (0 if above else tick_h)
+        # Label
+        dy = -10 if above else 18
+        tick_fmt = _TICK_FMT % (_f2(y1), _f2(y2))
+        label_fmt = _TICK_LABEL_FMT % (_f2(y + dy), font_size)
         elems = []
-        tick_n = max(2, int(getattr(args, 'depth_axis_ticks', 5)))
-        span = xr - xl
-        for i in range(tick_n + 1):
-            x = xl + span * (i / tick_n)
-            # Tick line
-            tick_h = 6
-            y1 = y - (tick_h if above else 0)
-            y2 = y + (0 if above else tick_h)
-            elems.append(f'<line x1="{x:.2f}" y1="{y1:.2f}" x2="{x:.2f}" y2="{y2:.2f}" class="axis-tick"/>')
-            # Label
-            val = int(round(ls + (le - ls) * (i / tick_n)))
-            dy = -10 if above else 18
-            font_size = getattr(args, 'depth_axis_font_size', 12)
-            elems.append(f'<text x="{x:.2f}" y="{(y + dy):.2f}" class="axis-label" font-size="{font_size}">{val}</text>')
+        for x, val in zip(xs.tolist(), vals.tolist()):
+            elems.append(tick_fmt % (x, x))
+            elems.append(label_fmt % (x, val))
         return elems
-    svg_parts.extend(_axis_ticks(x_left_top, x_right_top, baseline1_y, label1_start, label1_end, above=True))
+    svg_parts.extend(_axis_ticks(layout.x_left_top, layout.x_right_top, baseline1_y, label1_start, label1_end, above=True))
 
     # Middle LINKVIEW contents (translate by global_offset)
     svg_parts.append(f'<g transform="translate(0,{middle_y:.2f})">{inner}</g>')
@@ -583,37 +639,36 @@ def run(args: argparse.Namespace):
     svg_parts.extend(bg_2)
     svg_parts.extend(bars_top_2)
     svg_parts.extend(bars_bottom_2)
-    svg_parts.append(f'<line x1="{x_left_bottom:.2f}" y1="{baseline2_y:.2f}" x2="{x_right_bottom:.2f}" y2="{baseline2_y:.2f}" class="baseline"/>')
+    svg_parts.append(f'<line x1="{layout.x_left_bottom:.2f}" y1="{baseline2_y:.2f}" x2="{layout.x_right_bottom:.2f}" y2="{baseline2_y:.2f}" class="baseline"/>')
     # Bottom: labels below the axis
-    svg_parts.extend(_axis_ticks(x_left_bottom, x_right_bottom, baseline2_y, label2_start, label2_end, above=False))
+    svg_parts.extend(_axis_ticks(layout.x_left_bottom, layout.x_right_bottom, baseline2_y, label2_start, label2_end, above=False))
 
     svg_parts.append('</svg>')
-    svg_text = '\n'.join(svg_parts)
+    # Encode once; the same bytes go to disk and to the PDF converter
+    svg_bytes = _shrink_svg('\n'.join(svg_parts).encode('utf-8'))
 
+    # Keep only one output file: svg or pdf. PDF conversion reads the SVG bytes from
+    # memory (cairosvg) or stdin (inkscape); the SVG is only written if both fail.
     out_svg = args.output + '.svg'
-    with open(out_svg, 'w', encoding='utf-8') as fo:
-        fo.write(svg_text)
-
-    # Keep only one output file: svg or pdf
+    converted = False
     if args.output_format == 'pdf':
-        converted = False
         try:
             import cairosvg
-            cairosvg.svg2pdf(bytestring=svg_text.encode('utf-8'), write_to=args.output + '.pdf')
+            cairosvg.svg2pdf(bytestring=svg_bytes, write_to=args.output + '.pdf')
             converted = True
         except Exception:
             try:
-                exit_code = os.system(f'inkscape --file {out_svg} --export-type=pdf --export-filename {args.output}.pdf')
-                converted = (exit_code == 0)
+                result = subprocess.run(['inkscape', '--pipe', '--export-type=pdf',
+                                         f'--export-filename={args.output}.pdf'],
+                                        input=svg_bytes, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                converted = (result.returncode == 0)
             except Exception:
                 converted = False
-        if converted:
-            try:
-                os.remove(out_svg)
-            except Exception:
-                pass
-        else:
+        if not converted:
             print('warning: pdf conversion failed, keeping SVG output')
+    if not converted:
+        with open(out_svg, 'wb') as fo:
+            fo.write(svg_bytes)
 
     # Clean up LINKVIEW temporary artifacts
     if not args.keep_tmp:
@@ -623,6 +678,12 @@ def run(args: argparse.Namespace):
             pass
 
 
+def _gzip_buffer_arg(value) -> int:
+    """argparse type for --gzip-buffer; validated by depth_plotter, imported only when the option is given"""
+    from depth_plotter import _gzip_buffer_arg
+    return _gzip_buffer_arg(value)
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description='Static montage integrating GCI depth and LINKVIEW alignments (SVG)')
     # —— LINKVIEW original parameters ——
@@ -673,6 +734,8 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument('-w','--window-size', default=1000, type=int)
     p.add_argument('--max-depth-ratio', default=3.0, type=float)
     p.add_argument('--min-safe-depth', default=5, type=int)
+    p.add_argument('--cache-dir', help='Directory for caching parsed depth arrays (reused by later runs)')
+    p.add_argument('--gzip-buffer', default=None, type=_gzip_buffer_arg, help='Decompression buffer size in bytes for .gz depth files (minimum 4096, default 1 MiB)')
 
     # —— Layout parameters (new: depth panel height and gap) ——
     p.add_argument('--depth_height', default=160, type=int, help='Height of each depth panel')
@@ -685,9 +748,38 @@ def build_parser() -> argparse.ArgumentParser:
     return p
 
 
-def main():
-    parser = build_parser()
-    args = parser.parse_args()
+_PARSER = None
+_DEFAULTS = None
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    """Build the CLI parser once per process and reuse it for repeated main() calls"""
+    global _PARSER
+    if _PARSER is None:
+        _PARSER = build_parser()
+    return _PARSER
+
+
+def run_from_dict(options: dict):
+    """Run directly from a dict of option values (argparse dest names, e.g. 'window_size'),
+    skipping command-line tokenization; unspecified options take the CLI defaults.
+    """
+    global _DEFAULTS
+    if _DEFAULTS is None:
+        _DEFAULTS = {a.dest: a.default for a in _get_parser()._actions if a.default != argparse.SUPPRESS}
+    missing = [k for k in ('input', 'fai') if not options.get(k)]
+    if missing:
+        raise ValueError(f'missing required options: {", ".join(missing)}')
+    if options.get('gzip_buffer') is not None:
+        try:
+            _gzip_buffer_arg(options['gzip_buffer'])
+        except argparse.ArgumentTypeError as e:
+            raise ValueError(f'gzip_buffer: {e}')
+    return run(argparse.Namespace(**{**_DEFAULTS, **options}))
+
+
+def main(argv=None):
+    args = _get_parser().parse_args(argv)
     run(args)
 
 